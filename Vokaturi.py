@@ -70,7 +70,7 @@ class Voice:
 		_library.VokaturiVoice_setRelativePriorProbabilities(self._voice, priorEmotionProbabilities)
 
 	def fill(self, num_samples, samples):
-		_library.VokaturiVoice_fill(self._voice, num_samples, samples)
+		_library.VokaturiVoice_fill(self._voice, num_samples, _samplePointer(samples, num_samples))
 
 	def extract(self, quality, emotionProbabilities):
 		_library.VokaturiVoice_extract(self._voice, quality, emotionProbabilities)
@@ -82,8 +82,53 @@ class Voice:
 		if not _library is None:
 			_library.VokaturiVoice_destroy(self._voice)
 
+class VoicePool:
+	"""Keeps one Voice per (sample_rate, buffer_length), reset and ready to fill, instead of creating and destroying
+	a Voice per analysis. Voices for other sizes are destroyed once the requested size changes."""
+
+	def __init__(self):
+		self._voices = {}
+
+	def get(self, sample_rate, buffer_length):
+		key = (sample_rate, buffer_length)
+		voice = self._voices.get(key)
+		if voice is None:
+			self.clear()
+			voice = Voice(sample_rate, buffer_length)
+			self._voices[key] = voice
+		else:
+			voice.reset()
+		return voice
+
+	def clear(self):
+		for voice in self._voices.values():
+			voice.destroy()
+		self._voices.clear()
+
 def versionAndLicense():
 	return _library.Vokaturi_versionAndLicense().decode("UTF-8")
 
 def SampleArrayC(size):
 	return (ctypes.c_double * size)()
+
+class SampleBuffer:
+	"""A preallocated sample array that is reused across fills; reallocated only when a larger one is needed."""
+
+	def __init__(self, size = 0):
+		self._array = SampleArrayC(size)
+
+	def get(self, size):
+		if len(self._array) < size:
+			self._array = SampleArrayC(size)
+		return self._array
+
+def _samplePointer(samples, num_samples):
+	# A NumPy array is passed without copying, by handing its data pointer to the library.
+	# ctypes arrays (see SampleArrayC and SampleBuffer) are passed as is.
+	if not hasattr(samples, "__array_interface__"):
+		return samples
+	if samples.dtype.char != "d" or not samples.flags["C_CONTIGUOUS"]:
+		raise TypeError("samples must be a C-contiguous float64 array")
+	if samples.size < num_samples:
+		raise ValueError("samples holds fewer than num_samples values")
+	return samples.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
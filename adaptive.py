@@ -0,0 +1,87 @@
+# adaptive.py
+# Tunes the length of the analyzed windows, and the hop between them, while the lamp runs
+
+import time
+
+
+class WindowController:
+    """
+    Adapts window length and hop to the room and the device, every `period` extraction results:
+     - too few valid results (below min_valid) grow the window by `step`, as long as the latency
+       (window length plus analysis time) stays within `budget`
+     - enough valid results, with CPU headroom or a latency over budget, shrink it again by `step`
+     - the hop grows while the analysis takes more than `max_load` of it (falling behind), and shrinks
+       back towards min_hop once it takes less than half of that
+    The button (press()) is a manual override: every press makes the window longer by `step`, wrapping
+    around from max_seconds to min_seconds, and holds it there for `override_seconds`.
+    """
+
+    def __init__(self, seconds, hop, min_seconds=0.2, max_seconds=2.0, budget=1.0, min_valid=0.6, adaptive=True,
+                 period=10, step=0.1, max_load=0.8, override_seconds=60):
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.min_hop = hop
+        self.seconds = self.bounded(seconds)
+        self.hop = hop
+        self.budget = budget
+        self.min_valid = min_valid
+        self.adaptive = adaptive
+        self.period = period
+        self.step = step
+        self.max_load = max_load
+        self.override_seconds = override_seconds
+        self.valid_rate = 1.0
+        self.load = 0.0
+        self.changes = 0
+        self._override_until = 0.0
+        self._results = 0
+        self._valid = 0
+        self._cost = 0.0
+
+    def bounded(self, seconds):
+        return round(min(self.max_seconds, max(self.min_seconds, seconds)), 2)
+
+    @property
+    def overridden(self):
+        return time.monotonic() < self._override_until
+
+    def press(self):
+        """Manual override: the next longer window, or the shortest one after the longest"""
+        seconds = self.seconds + self.step
+        self.seconds = self.min_seconds if self.max_seconds + 1e-6 < seconds else self.bounded(seconds)
+        self._override_until = time.monotonic() + self.override_seconds
+
+    def observe(self, valid, cost):
+        """Adds one extraction result, and the seconds it took to analyze the window"""
+        self._results += 1
+        self._valid += 1 if valid else 0
+        self._cost += cost
+        if self.period <= self._results:
+            self.valid_rate = self._valid / self._results
+            cost = self._cost / self._results
+            self._results, self._valid, self._cost = 0, 0, 0.0
+            if self.adaptive:
+                self.adjust(cost)
+
+    def adjust(self, cost):
+        seconds, hop = self.seconds, self.hop
+        self.load = cost / hop
+        if not self.overridden:
+            if self.valid_rate < self.min_valid:
+                if seconds + self.step + cost <= self.budget:
+                    seconds = self.bounded(seconds + self.step)
+            elif self.min_valid + 0.1 <= self.valid_rate and \
+                    (self.budget < seconds + cost or self.load < self.max_load / 2):
+                seconds = self.bounded(seconds - self.step)
+        if self.max_load < self.load:
+            hop = round(min(self.max_seconds, hop + self.step / 2), 2)
+        elif self.load < self.max_load / 2:
+            hop = round(max(self.min_hop, hop - self.step / 2), 2)
+        if (seconds, hop) != (self.seconds, self.hop):
+            self.changes += 1
+        self.seconds, self.hop = seconds, hop
+
+    def counters(self):
+        """Returns the current window and what it is based on as a dict"""
+        return {'seconds': self.seconds, 'hop': self.hop, 'valid_rate': round(self.valid_rate, 3),
+                'load': round(self.load, 3), 'changes': self.changes, 'overridden': self.overridden}
@@ -0,0 +1,42 @@
+# analysis.py
+# Hardware independent analysis steps, shared by the live lamp (emoLamp.py) and the offline analysis (batch.py)
+
+import math
+import numpy
+import Vokaturi
+
+TARGET_DBFS = -25
+MAX_LOUDNESS = 103  # raw reading  would be -3
+SILENCE_DBFS = -120.0  # reported for all zero samples, instead of -inf
+
+
+def normalize(samples):
+    """Normalizes the provided int16 scaled samples to TARGET_DBFS, returns loudness in dBFS and float64 samples"""
+    normalized = numpy.multiply(samples, 1 / 32768.0, dtype=numpy.float64)
+    flat = normalized.ravel()
+    rms = math.sqrt(numpy.dot(flat, flat) / flat.size) if flat.size else 0.0
+    if rms == 0:
+        return SILENCE_DBFS, normalized  # digital silence, nothing to normalize
+    decibel = 20 * math.log10(rms)  # -3 is (maximum loudness)
+    normalized *= 10 ** ((TARGET_DBFS - decibel) / 20)
+    numpy.clip(normalized, -1.0, 1.0, out=normalized)
+    return decibel, normalized
+
+
+def extract(voices, sample_rate, samples, loudness, min_loudness):
+    """
+    Computes Quality and EmotionProbabilities from the provided normalized float64 samples, using a voice
+    from the VoicePool. The probabilities are all 0 if the result is invalid or the sound was too quiet.
+    """
+    buffer_length = len(samples)
+    if samples.ndim != 1:  # stereo
+        samples = 0.5 * (samples[:, 0] + samples[:, 1])
+
+    voice = voices.get(sample_rate, buffer_length)
+    voice.fill(buffer_length, samples)  # passed without copy
+    quality = Vokaturi.Quality()
+    ep = Vokaturi.EmotionProbabilities()
+    voice.extract(quality, ep)
+    if not quality.valid or MAX_LOUDNESS + loudness <= min_loudness:
+        ep = Vokaturi.EmotionProbabilities(0, 0, 0, 0, 0)
+    return quality, ep
@@ -2,7 +2,11 @@
 from https://github.com/tinue/APA102_Pi
 This is the main driver module for APA102 LEDs
 """
-import spidev
+import numpy
+try:
+    import spidev
+except ImportError: # not on a Raspberry Pi, pass an spi device (e.g. fakes.RecordingSpiDev) instead
+    spidev = None
 from math import ceil
 
 RGB_MAP = { 'rgb': [3, 2, 1], 'rbg': [3, 1, 2], 'grb': [2, 3, 1],
@@ -19,6 +23,10 @@ class APA102:
     Public methods are:
      - set_pixel
      - set_pixel_rgb
+     - set_pixels
+     - fill
+     - rotate
+     - set_gamma
      - show
      - clear_strip
      - cleanup
@@ -73,9 +81,11 @@ class APA102:
     # Constants
     MAX_BRIGHTNESS = 31 # Safeguard: Set to a value appropriate for your setup
     LED_START = 0b11100000 # Three "1" bits, followed by 5 brightness bits
+    START_FRAME_BYTES = 4 # 32 zero bits
+    MAX_XFER = 4096 # SPI takes up to 4096 bytes per xfer operation
 
     def __init__(self, num_led, global_brightness=MAX_BRIGHTNESS,
-                 order='rgb', bus=0, device=1, max_speed_hz=8000000):
+                 order='rgb', bus=0, device=1, max_speed_hz=8000000, spi=None):
         self.num_led = num_led  # The number of LEDs in the Strip
         order = order.lower()
         self.rgb = RGB_MAP.get(order, RGB_MAP['rgb'])
@@ -85,8 +95,23 @@ class APA102:
         else:
             self.global_brightness = global_brightness
 
-        self.leds = [self.LED_START,0,0,0] * self.num_led # Pixel buffer
-        self.spi = spidev.SpiDev()  # Init the SPI device
+        # The whole frame sent to the strip: start frame, pixels, end frame.
+        # self.leds is a view of the pixels within it, so show() needs no copying.
+        end_frame_bytes = (self.num_led + 15) // 16 # Round up num_led/2 bits
+        self.frame = bytearray(self.START_FRAME_BYTES + 4 * self.num_led + end_frame_bytes)
+        self.leds = memoryview(self.frame)[self.START_FRAME_BYTES:self.START_FRAME_BYTES + 4 * self.num_led]
+        self.leds[0::4] = bytes([self.LED_START]) * self.num_led # Pixel buffer
+        self.dirty = True # Pixel buffer written since the last show()
+        self._sent = None # Copy of the frame last sent, show() skips a frame that is the same
+        # The same pixel buffer as (num_led x 4) NumPy array, for the bulk methods
+        self.pixels = numpy.frombuffer(self.frame, dtype=numpy.uint8, count=4 * self.num_led,
+                                       offset=self.START_FRAME_BYTES).reshape(self.num_led, 4)
+        self._scratch = numpy.empty_like(self.pixels) # for rotate()
+        # Lookup tables: color value -> corrected value, brightness percent -> LED start byte
+        self.gamma = numpy.arange(256, dtype=numpy.uint8)
+        self.brightness = numpy.array([(ceil(p * self.global_brightness / 100.0) & 0b00011111) | self.LED_START
+                                       for p in range(101)], dtype=numpy.uint8)
+        self.spi = spidev.SpiDev() if spi is None else spi  # Init the SPI device
         self.spi.open(bus, device)  # Open SPI port 0, slave device (CS) 1
         # Up the speed a bit, so that the LEDs are painted faster
         if max_speed_hz:
@@ -136,8 +161,7 @@ class APA102:
     def clear_strip(self):
         """ Turns off the strip and shows the result right away."""
 
-        for led in range(self.num_led):
-            self.set_pixel(led, 0, 0, 0)
+        self.fill(0, 0, 0)
         self.show()
 
 
@@ -164,9 +188,42 @@ class APA102:
 
         start_index = 4 * led_num
         self.leds[start_index] = ledstart
-        self.leds[start_index + self.rgb[0]] = red
-        self.leds[start_index + self.rgb[1]] = green
-        self.leds[start_index + self.rgb[2]] = blue
+        self.leds[start_index + self.rgb[0]] = int(self.gamma[red])
+        self.leds[start_index + self.rgb[1]] = int(self.gamma[green])
+        self.leds[start_index + self.rgb[2]] = int(self.gamma[blue])
+        self.dirty = True
+
+
+    def set_pixels(self, colors, bright_percent=100, start=0):
+        """Sets the colors of consecutive pixels, starting with led_num start.
+
+        colors is an (N x 3) array (or nested list) of [red, green, blue]
+        values, or bytes of N concatenated red, green, blue triples.
+        bright_percent is one value for all, or one value per pixel.
+        All pixels are written to the pixel buffer in one vectorized
+        operation; pixels beyond the end of the strip are ignored.
+        """
+        if isinstance(colors, (bytes, bytearray, memoryview)):
+            colors = numpy.frombuffer(colors, dtype=numpy.uint8).reshape(-1, 3)
+        else:
+            colors = numpy.clip(numpy.asarray(colors), 0, 255).astype(numpy.uint8).reshape(-1, 3)
+        count = max(0, min(len(colors), self.num_led - start))
+        pixels = self.pixels[start:start + count]
+        pixels[:, self.rgb] = self.gamma[colors[:count]]
+        bright = numpy.clip(numpy.asarray(bright_percent), 0, 100).astype(int)
+        pixels[:, 0] = self.brightness[bright if bright.ndim == 0 else bright[:count]]
+        self.dirty = True
+
+
+    def fill(self, red, green, blue, bright_percent=100, start=0, count=None):
+        """Sets count pixels (default: all up to the end), starting with led_num start, to one color."""
+        count = self.num_led - start if count is None else min(count, self.num_led - start)
+        self.set_pixels(numpy.tile(numpy.array([red, green, blue]), (max(0, count), 1)), bright_percent, start)
+
+
+    def set_gamma(self, gamma=1.0):
+        """Sets the gamma correction applied to all colors set from now on; 1.0 turns it off."""
+        self.gamma[:] = numpy.round(255 * (numpy.arange(256) / 255.0) ** gamma)
 
 
     def set_pixel_rgb(self, led_num, rgb_color, bright_percent=100):
@@ -189,20 +246,32 @@ class APA102:
         the specified number of positions. The number could be negative,
         which means rotating in the opposite direction.
         """
-        cutoff = 4 * (positions % self.num_led)
-        self.leds = self.leds[cutoff:] + self.leds[:cutoff]
+        cutoff = positions % self.num_led
+        remaining = self.num_led - cutoff
+        self._scratch[:remaining] = self.pixels[cutoff:]
+        self._scratch[remaining:] = self.pixels[:cutoff]
+        self.pixels[:] = self._scratch
+        self.dirty = True
 
 
-    def show(self):
+    def show(self, force=False):
         """Sends the content of the pixel buffer to the strip.
 
-        Todo: More than 1024 LEDs requires more than one xfer operation.
+        Start frame, pixels and end frame go out in one transfer, or in
+        chunks of MAX_XFER bytes for long strips. Nothing is sent if the
+        pixels are the same as the ones sent last, unless forced.
         """
-        self.clock_start_frame()
-        # xfer2 kills the list, unfortunately. So it must be copied first
-        # SPI takes up to 4096 Integers. So we are fine for up to 1024 LEDs.
-        self.spi.xfer2(list(self.leds))
-        self.clock_end_frame()
+        if not force and (not self.dirty or self.frame == self._sent):
+            self.dirty = False
+            return
+        if hasattr(self.spi, 'writebytes2'): # spidev 3.4+, chunks by itself
+            self.spi.writebytes2(self.frame)
+        else:
+            # xfer2 kills the list, unfortunately. So it must be copied first
+            for start in range(0, len(self.frame), self.MAX_XFER):
+                self.spi.xfer2(list(self.frame[start:start + self.MAX_XFER]))
+        self._sent = bytes(self.frame)
+        self.dirty = False
 
 
     def cleanup(self):
@@ -235,4 +304,4 @@ class APA102:
     def dump_array(self):
         """For debug purposes: Dump the LED array onto the console."""
 
-        print(self.leds)
+        print(list(self.leds))
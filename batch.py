@@ -0,0 +1,143 @@
+# batch.py
+# Offline analysis of recorded WAV files, much faster than real time, e.g. to tune params.py or to regression test
+# Multi-channel files are analyzed on their best channel, see channels.ChannelSelector
+# Usage: python3 batch.py [-o results.csv] [--jsonl] [--workers N] [--lib path] file.wav|directory ...
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import numpy
+import scipy.io.wavfile
+import analysis
+import channels
+import palette
+import params
+import resampler
+import smoother
+import vad
+import Vokaturi
+
+CHUNK_WINDOWS = 25  # number of consecutive windows analyzed per task, by one worker process
+FIELDS = ['file', 'window', 'seconds', 'dbfs', 'valid', 'frames'] + list(smoother.EMOTIONS) + ['count'] + \
+         ['avg_' + emo for emo in smoother.EMOTIONS] + ['red', 'green', 'blue']
+
+_voices = None  # VoicePool of the worker process
+
+
+def wav_files(paths):
+    """Returns the provided WAV files, and the WAV files in the provided directories, sorted by name"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith('.wav'))
+        else:
+            files.append(path)
+    return files
+
+
+def tasks(files, window_seconds, hop_seconds):
+    """Slices every file into windows, like the live lamp does, and groups them into tasks of CHUNK_WINDOWS"""
+    for path in files:
+        rate, samples = scipy.io.wavfile.read(path, mmap=True)  # reads the header only
+        length = len(samples)
+        window, hop = int(rate * window_seconds), int(rate * hop_seconds)
+        count = 0 if length < window else (length - window) // hop + 1
+        for first in range(0, count, CHUNK_WINDOWS):
+            yield path, first, min(CHUNK_WINDOWS, count - first), window_seconds, hop_seconds
+
+
+def int16_scaled(samples):
+    """Returns the samples scaled like int16 samples, whatever the sample format of the file"""
+    if samples.dtype == numpy.uint8:
+        return (samples.astype(numpy.int16) - 128) * 256
+    if samples.dtype == numpy.int32:
+        return samples / 65536.0
+    if samples.dtype.kind == 'f':
+        return samples * 32768.0
+    return samples
+
+
+def init_worker(library):
+    global _voices
+    Vokaturi.load(library)
+    _voices = Vokaturi.VoicePool()
+
+
+def analyze(task):
+    """Normalizes and analyzes the windows of one task, returns one row per window"""
+    path, first, count, window_seconds, hop_seconds = task
+    rate, samples = scipy.io.wavfile.read(path, mmap=True)
+    window, hop = int(rate * window_seconds), int(rate * hop_seconds)
+    analysis_rate = params.ANALYSIS_RATE or rate
+    resample = resampler.Resampler(rate, analysis_rate)
+    detect = vad.VoiceActivityDetector(rate, params.MIN_LOUDNESS - analysis.MAX_LOUDNESS, params.VAD_MAX_ZCR,
+                                       params.VAD_HANGOVER)  # hangover starts anew with every task
+    select = None if samples.ndim == 1 else channels.ChannelSelector(rate)
+    rows = []
+    for i in range(first, first + count):
+        raw = int16_scaled(numpy.array(samples[i * hop:i * hop + window]))
+        if params.VAD and not detect(raw):
+            dbfs, quality, ep = max(detect.dbfs, analysis.SILENCE_DBFS), Vokaturi.Quality(), None
+        else:
+            if select is not None:
+                raw = select(raw)  # the best channel only
+            dbfs, normalized = analysis.normalize(resample(raw))
+            quality, ep = analysis.extract(_voices, analysis_rate, normalized, dbfs, params.MIN_LOUDNESS)
+        probabilities = [0.0] * 5 if ep is None else [getattr(ep, emo) for emo in smoother.EMOTIONS]
+        rows.append([path, i, round(i * hop / rate, 3), round(dbfs, 2), quality.valid, quality.num_frames_analyzed]
+                    + probabilities)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyzes WAV files offline, window by window, like emoLamp.py')
+    parser.add_argument('paths', nargs='+', help='WAV files or directories with WAV files')
+    parser.add_argument('-o', '--output', help='result file, default stdout')
+    parser.add_argument('--jsonl', action='store_true', help='write JSON lines instead of CSV')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='number of processes')
+    parser.add_argument('--window', type=float, default=params.WINDOW_SECONDS, help='window length in seconds')
+    parser.add_argument('--hop', type=float, default=params.HOP_SECONDS, help='time between windows in seconds')
+    parser.add_argument('--lib', default='./lib/pi3b.so' if platform.machine() == 'armv7l' else './lib/piZero.so',
+                        help='path to the Vokaturi library')
+    args = parser.parse_args()
+
+    colors = palette.Palette.from_params(params)
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    writer = None if args.jsonl else csv.writer(out)
+    if writer:
+        writer.writerow(FIELDS)
+    average, current, windows, seconds = None, None, 0, 0.0
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers, init_worker, (args.lib,)) as pool:
+        for rows in pool.imap(analyze, tasks(wav_files(args.paths), args.window, args.hop)):
+            averages = []
+            for row in rows:
+                if row[0] != current:  # smoothing starts anew with every file
+                    current = row[0]
+                    average = smoother.Smoother(params.MOVE_AVG, params.SMOOTHING, params.EMA_SECONDS, args.hop,
+                                                params.HYSTERESIS)
+                k, b = average.update(Vokaturi.EmotionProbabilities(*row[6:11]))
+                averages.append([k] + [getattr(b, emo) for emo in smoother.EMOTIONS])
+            rgb = colors.colors([a[1:] for a in averages]).tolist()  # one vectorized call per task
+            for row, a, c in zip(rows, averages, rgb):
+                row = row + a + c
+                if writer:
+                    writer.writerow(row)
+                else:
+                    out.write(json.dumps(dict(zip(FIELDS, row))) + '\n')
+            windows += len(rows)
+            seconds += len(rows) * args.hop
+    elapsed = time.perf_counter() - start
+    if out is not sys.stdout:
+        out.close()
+    sys.stderr.write('%d windows in %.1f s: %.1f windows/s, %.1f x real time\n' %
+                     (windows, elapsed, windows / elapsed, seconds / elapsed))
+
+
+if __name__ == "__main__":
+    main()
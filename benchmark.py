@@ -0,0 +1,149 @@
+# benchmark.py
+# Measures the time per analysis window, on the Raspberry Pi or, with the stand-ins from fakes.py, on any computer
+# Usage: python3 benchmark.py rates [--lib path | --fake]
+#        python3 benchmark.py suite [--lib path] [--windows N] [--speed X] [--replay file.wav] [--bulb-latency s]
+#                                   [--leds N]
+
+import argparse
+import shutil
+import tempfile
+import time
+import platform
+import numpy
+import emoLamp
+import fakes
+import metrics
+import params
+import resampler
+import Vokaturi
+
+RATE = 44100
+ANALYSIS_RATES = [44100, 22050, 16000]
+WINDOW_SECONDS = 0.4
+REPEATS = 50
+
+
+def synthetic_window(seconds, rate, pitch=180.0):
+    """Returns int16 scaled samples of a voice-like sound: a harmonic tone with vibrato, plus some noise"""
+    t = numpy.arange(int(seconds * rate)) / rate
+    phase = 2 * numpy.pi * pitch * (t + 0.02 * numpy.sin(2 * numpy.pi * 5 * t))
+    tone = sum(numpy.sin(k * phase) / k for k in range(1, 12))
+    noise = numpy.random.RandomState(0).normal(0, 0.05, len(t))
+    return (8000 * (tone + noise)).astype(numpy.int16)
+
+
+def bench_rate(samples, analysis_rate, repeats=REPEATS):
+    """Returns the mean resample and extract time per window in milliseconds"""
+    resample = resampler.Resampler(RATE, analysis_rate)
+    voices = Vokaturi.VoicePool()
+    quality = Vokaturi.Quality()
+    ep = Vokaturi.EmotionProbabilities()
+    resample_time = extract_time = 0.0
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        window = numpy.multiply(resample(samples), 1 / 32768.0, dtype=numpy.float64)
+        t1 = time.perf_counter()
+        voice = voices.get(analysis_rate, len(window))
+        voice.fill(len(window), window)
+        voice.extract(quality, ep)
+        t2 = time.perf_counter()
+        resample_time += t1 - t0
+        extract_time += t2 - t1
+    voices.clear()
+    return 1000 * resample_time / repeats, 1000 * extract_time / repeats
+
+
+def bench_rates(seconds=WINDOW_SECONDS, repeats=REPEATS):
+    """Prints the per-window times for each of the ANALYSIS_RATES"""
+    samples = synthetic_window(seconds, RATE)
+    print('%d ms windows, %d repeats' % (1000 * seconds, repeats))
+    print('%8s %12s %12s %12s' % ('rate', 'resample ms', 'extract ms', 'total ms'))
+    for rate in ANALYSIS_RATES:
+        r, e = bench_rate(samples, rate, repeats)
+        print('%8d %12.2f %12.2f %12.2f' % (rate, r, e, r + e))
+
+
+def stage_report(stages, windows, elapsed):
+    """Prints mean, 95th percentile and max latency per stage, from Metrics histogram snapshots, and the throughput"""
+    print('%-10s %10s %10s %10s %8s' % ('stage', 'mean ms', 'p95 ms', 'max ms', 'count'))
+    for stage, h in stages.items():
+        print('%-10s %10.3f %10.3f %10.3f %8d' % (stage, h['mean_ms'], h['p95_ms'], h['max_ms'], h['count']))
+    print('%d windows in %.2f s: %.1f windows/s (real time needs %.1f)' %
+          (windows, elapsed, windows / elapsed, 1 / params.HOP_SECONDS))
+
+
+def bench_suite(windows=100, source=None, bulb_latency=0.05, num_led=3, speed=1.0, vokaturi=None):
+    """
+    Runs the lamp itself, emoLamp.EmoLamp with all of its pipeline, on the stand-ins from fakes.py: sound from
+    `source` (synthetic by default) through a FakePyAudio at `speed` times real time, the neopixels on a
+    RecordingSpiDev, a FakeBulb and an emotion log in a temporary directory. Once `windows` windows were
+    captured, reports the latency of every stage as measured by the lamp's own Metrics, and ble-write
+    (the FakeBulb round trips).
+    """
+    bulbs = []
+
+    def bulb(mac, version, on_disconnect):
+        bulbs.append(fakes.FakeBulb(bulb_latency, on_disconnect=on_disconnect))
+        return bulbs[-1]
+
+    log_dir = tempfile.mkdtemp(prefix='emolog')
+    zone = {'name': 'benchmark', 'mac': 'fake', 'leds': num_led, 'button': False, 'metrics_port': None,
+            'display': 'none', 'log': log_dir}
+    app = emoLamp.EmoLamp(zone, audio=lambda: fakes.FakePyAudio(source, speed), spi=fakes.RecordingSpiDev(),
+                          bulb=bulb, vokaturi=vokaturi)
+    source = source or fakes.SyntheticAudio(emoLamp.RATE, app.config.CHANNELS)
+    try:
+        app.start()
+        start = time.perf_counter()
+        while app.metrics.counters.get('windows', 0) < windows and app.lamp.alive():
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+    finally:
+        app.shutdown()
+        shutil.rmtree(log_dir)
+    snapshot = app.metrics.snapshot()
+    stages = snapshot['stages']
+    if bulbs and bulbs[0].write_times:
+        h = metrics.Histogram()
+        for t in bulbs[0].write_times:
+            h.observe(t)
+        stages['ble-write'] = h.snapshot()
+    counters = snapshot['counters']
+    stage_report(stages, counters.get('windows', 0), elapsed)
+    print('vad skipped %d of %d windows, dropped %s, %d light frames, led %d transfers' %
+          (counters.get('vad_skipped', 0), counters.get('windows', 0), snapshot['queues'],
+           snapshot['light']['frames'], app.dev.spi.transfers if app.dev else 0))
+    if app.writer is not None:
+        print('bulb %d writes (%d coalesced, %d skipped)' % (app.writer.sent, app.writer.coalesced,
+                                                             app.writer.skipped))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the time per analysis window')
+    parser.add_argument('benchmark', choices=['rates', 'suite'], nargs='?', default='rates',
+                        help='extract time per analysis rate, or latency of every stage of the lamp')
+    parser.add_argument('--lib', help='path to the Vokaturi library, default: the one emoLamp.py would load')
+    parser.add_argument('--fake', action='store_true', help='use the fake Vokaturi library (default for the suite)')
+    parser.add_argument('--fake-cost', type=float, default=0.0, help='CPU seconds the fake library burns per second')
+    parser.add_argument('--windows', type=int, default=100, help='number of windows the suite runs')
+    parser.add_argument('--speed', type=float, default=1.0, help='times real time the fake microphone records')
+    parser.add_argument('--replay', help='WAV file the suite analyzes, instead of synthetic sound')
+    parser.add_argument('--bulb-latency', type=float, default=0.05, help='round trip time of the fake bulb')
+    parser.add_argument('--leds', type=int, default=3, help='number of LEDs on the fake strip')
+    args = parser.parse_args()
+    if args.lib:
+        load = lambda: Vokaturi.load(args.lib)
+    elif args.fake or args.benchmark == 'suite':
+        load = lambda: fakes.use_fake_vokaturi(args.fake_cost)
+    else:
+        load = lambda: Vokaturi.load('./lib/pi3b.so' if platform.machine() == 'armv7l' else './lib/piZero.so')
+    if args.benchmark == 'rates':
+        load()
+        bench_rates()
+    else:
+        source = fakes.ReplayAudio(args.replay) if args.replay else None
+        bench_suite(args.windows, source, args.bulb_latency, args.leds, args.speed, load)
+
+
+if __name__ == "__main__":
+    main()
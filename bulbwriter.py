@@ -0,0 +1,79 @@
+# bulbwriter.py
+# Sends colors to the Bluetooth bulb on its own thread, so that the analysis never waits on Bluetooth
+
+import logging
+import threading
+import time
+from pipeline import DropQueue, LATEST_WINS
+
+
+class BulbWriter(threading.Thread):
+    """
+    Background writer for a MagicHue bulb.
+
+    put() only fills a single, latest-wins slot and returns right away. The writer thread sends at most one
+    color every min_interval seconds (what the bulb firmware can keep up with), skips colors that are within
+    min_delta (per channel) of the color sent last, and checks / re-establishes the connection every
+    check_interval seconds, or right after a failed write.
+    """
+
+    def __init__(self, hue, min_interval=0.1, min_delta=0, check_interval=5.0):
+        threading.Thread.__init__(self, name='bulb', daemon=True)
+        self.hue = hue
+        self.min_interval = min_interval
+        self.min_delta = min_delta
+        self.check_interval = check_interval
+        self.connected = True
+        self.sent = 0
+        self.skipped = 0
+        self._slot = DropQueue(1, LATEST_WINS)
+        self._stopped = threading.Event()
+        self._last = None
+        self._last_time = 0.0
+        self._next_check = 0.0
+
+    def put(self, rgb):
+        """Queues the provided color for the bulb, replacing a color that was not sent yet"""
+        self._slot.put(list(rgb))
+
+    @property
+    def coalesced(self):
+        """Number of colors replaced by a newer one before they could be sent"""
+        return self._slot.dropped
+
+    def run(self):
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            if self._next_check <= now:
+                self._next_check = now + self.check_interval
+                try:
+                    self.connected = self.hue.check()
+                except Exception:  # e.g. the Bluetooth adapter went away, check again later
+                    logging.exception('bulb check failed')
+                    self.connected = False
+            rgb = self._slot.get(timeout=min(0.5, self.check_interval))
+            if rgb is None or not self.connected:
+                continue  # colors are discarded until the next check finds the bulb connected
+            if self._last is not None and max(abs(a - b) for a, b in zip(rgb, self._last)) <= self.min_delta:
+                self.skipped += 1
+                continue
+            wait = self._last_time + self.min_interval - time.monotonic()
+            if 0 < wait:
+                self._stopped.wait(wait)
+                rgb = self._slot.get(timeout=0) or rgb  # a newer color may have arrived meanwhile
+            try:
+                sent = self.hue.set_color(rgb)
+            except Exception:
+                logging.exception('bulb set_color failed')
+                sent = False
+            if sent:
+                self._last = rgb
+                self.sent += 1
+            else:
+                self.connected = False
+                self._next_check = 0.0  # check the connection right away
+            self._last_time = time.monotonic()
+
+    def stop(self, timeout=2.0):
+        self._stopped.set()
+        self.join(timeout)
@@ -0,0 +1,59 @@
+# capture.py
+# Non-blocking audio capture, using PyAudio's callback mode to record into a ring buffer
+
+try:
+    import pyaudio
+    paInt16, paInputOverflow, paContinue = pyaudio.paInt16, pyaudio.paInputOverflow, pyaudio.paContinue
+except ImportError:  # not installed, pass an audio object (e.g. fakes.FakePyAudio) instead
+    paInt16, paInputOverflow, paContinue = 8, 2, 0  # the PortAudio values
+
+
+class Capture:
+    """
+    Records from the OS defined input source, or the input device with the provided index, into a RingBuffer.
+
+    PortAudio calls back with every chunk of frames on its own thread, so no Python thread is
+    kept busy in blocking reads. Counters tell if the analysis is falling behind:
+     - overflows: chunks for which the input reported an overflow, i.e. audio lost before it reached us
+     - dropped_frames: frames written to the ring buffer but never analyzed
+    """
+
+    def __init__(self, audio, ring, rate, channels, chunk, sample_format=paInt16, device=None):
+        self.ring = ring
+        self.overflows = 0
+        self.chunks = 0
+        self.stream = audio.open(format=sample_format,
+                                 channels=channels,
+                                 rate=rate,
+                                 input=True,
+                                 input_device_index=device,
+                                 frames_per_buffer=chunk,
+                                 stream_callback=self._callback,
+                                 start=False)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        self.chunks += 1
+        if status & paInputOverflow:
+            self.overflows += 1
+        self.ring.write(in_data)
+        return None, paContinue
+
+    @property
+    def dropped_frames(self):
+        return self.ring.dropped
+
+    def counters(self):
+        """Returns the capture counters as a dict"""
+        return {'chunks': self.chunks,
+                'frames': self.ring.written,
+                'overflows': self.overflows,
+                'dropped_frames': self.ring.dropped}
+
+    def start(self):
+        self.stream.start_stream()
+
+    def stop(self):
+        self.stream.stop_stream()
+
+    def close(self):
+        self.stream.close()
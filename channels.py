@@ -0,0 +1,73 @@
+# channels.py
+# Multi-channel capture: picks the microphone channel(s) with the best signal, analyzes them in parallel and fuses
+
+import concurrent.futures
+import numpy
+import analysis
+import Vokaturi
+
+
+class ChannelSelector:
+    """
+    Scores the channels of an (N x channels) window by an SNR estimate: the power of the loudest frames
+    over the power of the quietest frames, in dB. Speech close to a microphone gives a high contrast,
+    diffuse room noise does not. Returns the best channel as a zero-copy (strided) view, or a copy of the
+    `top` best channels gathered into one array.
+    """
+
+    def __init__(self, rate, top=1, frame_seconds=0.02):
+        self.frame_length = max(1, int(rate * frame_seconds))
+        self.top = top
+        self.scores = None  # scores of the last window, by channel
+
+    def score(self, samples):
+        n = len(samples) // self.frame_length * self.frame_length
+        frames = samples[:n].reshape(-1, self.frame_length, samples.shape[1]).astype(numpy.float32)
+        power = numpy.einsum('ijk,ijk->ik', frames, frames) / self.frame_length + 1.0  # (frames x channels)
+        loud, quiet = numpy.percentile(power, [90, 10], axis=0)
+        return 10 * numpy.log10(loud / quiet)
+
+    def __call__(self, samples):
+        """Returns the best channel as 1-D view, or (weights, N x top copy) of the top channels, best first"""
+        self.scores = self.score(samples)
+        best = numpy.argsort(self.scores)[::-1][:self.top]
+        if self.top == 1:
+            return samples[:, best[0]]  # strided view, no copy
+        weights = numpy.maximum(self.scores[best], 0.0) + 1e-3
+        return weights / weights.sum(), samples[:, best]  # fancy indexing, copies the top channels
+
+
+class ParallelExtractor:
+    """
+    Extracts EmotionProbabilities from several channels on worker threads (the Vokaturi library runs
+    without holding the GIL), each with its own VoicePool, and fuses them: the valid results are averaged,
+    weighted by the channel weights.
+    """
+
+    def __init__(self, channels, sample_rate):
+        self.sample_rate = sample_rate
+        self.pools = [Vokaturi.VoicePool() for _ in range(channels)]
+        self.executor = concurrent.futures.ThreadPoolExecutor(channels, thread_name_prefix='extract')
+
+    def __call__(self, channels, weights, loudness, min_loudness):
+        futures = [self.executor.submit(analysis.extract, pool, self.sample_rate, samples, loudness, min_loudness)
+                   for pool, samples in zip(self.pools, channels)]
+        fused = numpy.zeros(5)
+        total = 0.0
+        quality = Vokaturi.Quality()
+        for w, future in zip(weights, futures):
+            q, ep = future.result()
+            quality.num_frames_analyzed += q.num_frames_analyzed
+            quality.num_frames_lost += q.num_frames_lost
+            if q.valid:
+                quality.valid = 1
+                fused += w * numpy.array([ep.neutrality, ep.happiness, ep.sadness, ep.anger, ep.fear])
+                total += w
+        if 0 < total:
+            fused /= total
+        return quality, Vokaturi.EmotionProbabilities(*fused)
+
+    def clear(self):
+        self.executor.shutdown(wait=True)  # a voice must not be destroyed while the library still uses it
+        for pool in self.pools:
+            pool.clear()
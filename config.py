@@ -0,0 +1,166 @@
+# config.py
+# Immutable, validated snapshots of params.py, reloaded while the lamp runs when the file changes
+
+import logging
+import os
+import re
+import runpy
+import threading
+import analysis
+import display
+import palette
+import pipeline
+import smoother
+import transition
+
+# Settings only read when the lamp starts, a change is logged and takes effect with the next start
+RESTART_SETTINGS = ('MAC_ADDRESS', 'BULB_VERSION', 'CHANNELS', 'CHANNEL_TOP', 'ANALYSIS_RATE', 'RING_SECONDS',
+                    'QUEUE_SIZE', 'DROP_POLICY', 'VAD', 'DISPLAY', 'DISPLAY_RATE', 'METRICS_PORT',
+                    'METRICS_LOG_SECONDS', 'ZONES', 'ZONE_TIMEOUT', 'EMOTION_LOG', 'EMOTION_LOG_RECORDS')
+
+
+class Config:
+    """
+    One consistent set of settings: the upper case names and emotion colors of params.py as attributes,
+    plus the values derived from them, computed once per snapshot:
+     - palette: the compiled palette.Palette
+     - neo_scale: factor from a 0..255 color value to the neopixel value, MAX_NEO_VALUE / 255
+     - min_dbfs: the loudness threshold of the voice activity detection, from MIN_LOUDNESS
+    A snapshot cannot be changed: a new one is swapped in as a whole, so that a stage reading
+    `config = self.config` once sees either the old or the new settings, never a mix.
+    """
+
+    def __init__(self, values, path=None, mtime=0.0):
+        values = {k: tuple(v) if isinstance(v, list) else v
+                  for k, v in values.items() if k.isupper() or k in smoother.EMOTIONS}
+        validate(values)
+        self.__dict__.update(values)
+        self.__dict__.update(path=path, mtime=mtime,
+                             palette=palette.Palette.from_params(self),
+                             neo_scale=values['MAX_NEO_VALUE'] / 255,
+                             min_dbfs=values['MIN_LOUDNESS'] - analysis.MAX_LOUDNESS,
+                             _names=sorted(values))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('a Config is immutable, load a new one')
+
+    def changed(self, other):
+        """Returns the names of the settings that differ from the other snapshot"""
+        return [k for k in self._names if getattr(other, k, None) != getattr(self, k)]
+
+
+def validate(values):
+    """Raises ValueError naming the first setting that is missing or out of range"""
+    def check(name, ok, expected):
+        if name not in values:
+            raise ValueError('%s is missing' % name)
+        try:
+            if ok(values[name]):
+                return
+        except TypeError:
+            pass
+        raise ValueError('%s = %r, expected %s' % (name, values[name], expected))
+
+    positive = lambda v: 0 < v
+    flag = lambda v: isinstance(v, bool)
+    check('MAC_ADDRESS', lambda v: v is None or re.fullmatch('([0-9a-fA-F]{2}:){5}[0-9a-fA-F]{2}', v),
+          'None or a Bluetooth address, e.g. f8:1d:78:63:45:9d')
+    check('BULB_VERSION', lambda v: int(v) == v and 1 <= v, 'an int >= 1')
+    check('WINDOW_SECONDS', positive, 'seconds > 0')
+    check('HOP_SECONDS', positive, 'seconds > 0')
+    check('MIN_WINDOW_SECONDS', positive, 'seconds > 0')
+    check('MAX_WINDOW_SECONDS', lambda v: values['MIN_WINDOW_SECONDS'] <= v, 'seconds >= MIN_WINDOW_SECONDS')
+    check('LATENCY_BUDGET', positive, 'seconds > 0')
+    check('MIN_VALID', lambda v: 0 <= v <= 1, 'a fraction [0..1]')
+    check('ADAPTIVE_WINDOW', flag, 'True or False')
+    check('WINDOW_OVERRIDE_SECONDS', lambda v: 0 <= v, 'seconds >= 0')
+    check('RING_SECONDS', lambda v: values['MAX_WINDOW_SECONDS'] <= v, 'seconds >= MAX_WINDOW_SECONDS')
+    check('QUEUE_SIZE', lambda v: int(v) == v and 1 <= v, 'an int >= 1')
+    check('DROP_POLICY', lambda v: v in (pipeline.DROP_OLDEST, pipeline.LATEST_WINS), 'drop-oldest or latest-wins')
+    check('CHANNELS', lambda v: int(v) == v and 1 <= v, 'an int >= 1')
+    check('CHANNEL_TOP', lambda v: int(v) == v and 1 <= v, 'an int >= 1')
+    check('ANALYSIS_RATE', lambda v: v is None or (int(v) == v and 0 < v), 'None or samples per second > 0')
+    check('MOVE_AVG', lambda v: int(v) == v and 1 <= v, 'an int >= 1')
+    check('SMOOTHING', lambda v: v in (smoother.MAVG, smoother.EMA), 'mavg or ema')
+    check('EMA_SECONDS', positive, 'seconds > 0')
+    check('HYSTERESIS', lambda v: 0 <= v <= 1, 'a fraction [0..1]')
+    check('MIN_LOUDNESS', lambda v: 0 <= v <= 100, '[0..100]')
+    check('VAD', flag, 'True or False')
+    check('VAD_MAX_ZCR', lambda v: 0 <= v <= 1, 'a fraction [0..1]')
+    check('VAD_HANGOVER', lambda v: int(v) == v and 0 <= v, 'an int >= 0')
+    check('DISCRETE', flag, 'True or False')
+    check('RELATIVE', flag, 'True or False')
+    for emo in smoother.EMOTIONS:
+        check(emo, lambda v: len(v) == 3 and all(0 <= c <= 255 for c in v), '[red, green, blue], each [0..255]')
+    check('FRAME_RATE', positive, 'frames per second > 0')
+    check('TRANSITION_SECONDS', lambda v: 0 <= v, 'seconds >= 0')
+    check('FADE_SECONDS', lambda v: 0 <= v, 'seconds >= 0')
+    check('EASING', lambda v: v in transition.EASINGS, ' or '.join(transition.EASINGS))
+    check('NEO_PIXELS', lambda v: int(v) == v and 0 <= v, 'an int >= 0')
+    check('MAX_NEO_VALUE', lambda v: 0 <= v <= 255, '[0..255]')
+    check('DISPLAY', lambda v: v in display.KINDS, ' or '.join(display.KINDS))
+    check('DISPLAY_RATE', positive, 'updates per second > 0')
+    check('BULB_MIN_INTERVAL', lambda v: 0 <= v, 'seconds >= 0')
+    check('BULB_MIN_DELTA', lambda v: 0 <= v, '[0..255]')
+    check('BULB_CHECK_SECONDS', positive, 'seconds > 0')
+    check('ZONES', lambda v: all(isinstance(zone, dict) for zone in v), 'a list of dicts')
+    check('ZONE_TIMEOUT', positive, 'seconds > 0')
+    check('EMOTION_LOG', lambda v: v is None or (isinstance(v, str) and v), 'None or a directory')
+    check('EMOTION_LOG_RECORDS', lambda v: int(v) == v and 1 <= v, 'an int >= 1')
+    check('METRICS_PORT', lambda v: v is None or (int(v) == v and 0 <= v <= 65535), 'None or a port [0..65535]')
+    check('METRICS_LOG_SECONDS', lambda v: 0 <= v, 'seconds >= 0')
+    check('DEBUG_DUMP', flag, 'True or False')
+
+
+def load(path):
+    """Returns a new snapshot of the settings in the provided file"""
+    mtime = os.stat(path).st_mtime
+    return Config(runpy.run_path(path), path, mtime)
+
+
+def from_module(module):
+    """Returns a snapshot of an imported settings module, e.g. params"""
+    path = getattr(module, '__file__', None)
+    return Config(vars(module), path, os.stat(path).st_mtime if path else 0.0)
+
+
+class Watcher(threading.Thread):
+    """
+    Checks every `interval` seconds if the settings file changed, and if it did, loads it and passes the new
+    snapshot to on_change(). A file that does not load or validate is logged and ignored, the lamp keeps
+    running with the settings it has.
+    """
+
+    def __init__(self, config, on_change, interval=1.0):
+        threading.Thread.__init__(self, name='config', daemon=True)
+        self.config = config
+        self.on_change = on_change
+        self.interval = interval
+        self.mtime = config.mtime
+        self.reloads = 0
+        self.errors = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                mtime = os.stat(self.config.path).st_mtime
+                if mtime == self.mtime:
+                    continue
+                self.mtime = mtime
+                config = load(self.config.path)
+            except Exception as e:  # a half saved file, a syntax error, an invalid value, ...
+                logging.warning('%s not reloaded: %s' % (self.config.path, e))
+                self.errors += 1
+                continue
+            changed = config.changed(self.config)
+            restart = [name for name in changed if name in RESTART_SETTINGS]
+            logging.info('%s reloaded, changed: %s' % (config.path, ', '.join(changed) or 'nothing'))
+            if restart:
+                logging.warning('takes a restart: %s' % ', '.join(restart))
+            self.config = config
+            self.reloads += 1
+            self.on_change(config)
+
+    def stop(self):
+        self._stopped.set()
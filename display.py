@@ -0,0 +1,122 @@
+# display.py
+# Status display sinks, each rendering on its own thread so that stdout never slows down the analysis
+
+import json
+import sys
+import threading
+import time
+from pipeline import DropQueue, LATEST_WINS
+
+KINDS = ('auto', 'terminal', 'json', 'none')
+
+
+class Display(threading.Thread):
+    """
+    Base of the display sinks: update() only drops the newest state into a latest-wins slot, the thread
+    renders it at most `rate` times a second. States arriving faster than that are coalesced.
+    """
+
+    def __init__(self, rate=5.0):
+        threading.Thread.__init__(self, name='display', daemon=True)
+        self.interval = 1.0 / rate if rate else 0.0
+        self._slot = DropQueue(1, LATEST_WINS)
+        self._stopped = threading.Event()
+
+    def update(self, k, ep, decibel):
+        """Shows the provided count, EmotionProbabilities and loudness, eventually"""
+        self._slot.put((k, ep.neutrality, ep.happiness, ep.sadness, ep.anger, ep.fear, decibel))
+
+    def run(self):
+        while not self._stopped.is_set():
+            state = self._slot.get(timeout=0.5)
+            if state is None:
+                continue
+            self.render(*state)
+            self._stopped.wait(self.interval)
+
+    def render(self, k, neutrality, happiness, sadness, anger, fear, decibel):
+        raise NotImplementedError
+
+    def stop(self, timeout=1.0):
+        self._stopped.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+class NullDisplay(Display):
+    """Shows nothing, e.g. when running headless under systemd"""
+
+    def update(self, k, ep, decibel):
+        pass
+
+    def start(self):
+        pass
+
+
+class TerminalDisplay(Display):
+    """Progress-bar style view in the terminal, rewriting only the lines that changed"""
+
+    def __init__(self, rate=5.0, stream=sys.stdout):
+        Display.__init__(self, rate)
+        self.stream = stream
+        self.lines = []
+
+    def start(self):
+        self.stream.write('\033[2J')  # clear the screen
+        self.stream.flush()
+        Display.start(self)
+
+    def render(self, k, neutrality, happiness, sadness, anger, fear, decibel):
+        lines = [progress(neutrality * 100, 100, status='neutral'),
+                 progress(happiness * 100, 100, status='happiness'),
+                 progress(sadness * 100, 100, status='sadness'),
+                 progress(anger * 100, 100, status='anger'),
+                 progress(fear * 100, 100, status='fear'),
+                 '',
+                 progress(min(100, 120 + decibel), 100, status='dBFS'),
+                 progress(int(k), 10, status='Moving Avg.')]
+        out = []
+        for row, line in enumerate(lines):
+            if row < len(self.lines) and self.lines[row] == line:
+                continue
+            out.append('\033[%d;1H%s\033[K' % (row + 1, line))  # move to the line, write it, clear the rest
+        self.lines = lines
+        if out:
+            self.stream.write(''.join(out))
+            self.stream.flush()
+
+
+class JsonLinesDisplay(Display):
+    """One JSON object per line, for monitoring tools"""
+
+    def __init__(self, rate=5.0, stream=sys.stdout):
+        Display.__init__(self, rate)
+        self.stream = stream
+
+    def render(self, k, neutrality, happiness, sadness, anger, fear, decibel):
+        self.stream.write(json.dumps({'time': round(time.time(), 3), 'count': k,
+                                      'neutrality': round(neutrality, 4), 'happiness': round(happiness, 4),
+                                      'sadness': round(sadness, 4), 'anger': round(anger, 4), 'fear': round(fear, 4),
+                                      'dbfs': round(decibel, 2)}) + '\n')
+        self.stream.flush()
+
+
+def progress(count, total, status=''):
+    """Returns simple progress-bar style output"""
+    bar_len = 60
+    filled_len = int(round(bar_len * count / float(total)))
+    bar = '=' * filled_len + ' ' * (bar_len - filled_len)
+    return '[%s] %s %3d' % (bar, status, count)
+
+
+def create(kind, rate=5.0, stream=sys.stdout):
+    """Returns the display for params.DISPLAY: 'terminal', 'json', 'none', or 'auto' (terminal if there is one)"""
+    if kind == 'auto':
+        kind = 'terminal' if stream.isatty() else 'none'
+    if kind == 'terminal':
+        return TerminalDisplay(rate, stream)
+    if kind == 'json':
+        return JsonLinesDisplay(rate, stream)
+    if kind == 'none':
+        return NullDisplay(rate)
+    raise ValueError('unknown display %r' % kind)
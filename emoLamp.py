@@ -2,49 +2,50 @@
 # Author Wolf Paulus, Intuit IAT
 # Version 2018-03-26
 
-import os
-import sys
 import platform
-import math
-import copy
+import sys
 import time
 import threading
 import logging
-import pyaudio
+import os
 import wave
-import scipy.io.wavfile
-from pydub import AudioSegment
-from magicblue import MagicBlue, Effect
-import RPi.GPIO as GPIO
+import numpy
+import analysis
 import apa102
+import bulbwriter
+import channels
+import config
+import adaptive
+import display
+import emolog
+import metrics
+import pipeline
+import resampler
+import ringbuffer
+import smoother
+import transition
+import vad
 import Vokaturi
 import params
 
 logging.basicConfig(filename='eli.log', level=logging.INFO, format='%(asctime)s %(message)s')
-logging.info(platform.machine())  # Hardware 'pi3b.so' or 'piZero.so'
-
-if platform.machine() == 'armv7l':
-    Vokaturi.load('./lib/pi3b.so')
-    logging.info('pi3b.so loaded')
-else:
-    Vokaturi.load('./lib/piZero.so')
-    logging.info('piZero.so loaded')
 
-WAVE_FILENAME = "sound.wav"
-WORK_FILENAME = "work.wav"
+WAVE_FILENAME = "sound.wav"  # only written if params.DEBUG_DUMP
 NORM_WAV_FILENAME = "normalized.wav"
-FORMAT = pyaudio.paInt16
+SAMPLE_WIDTH = 2  # int16, i.e. pyaudio.paInt16
 CHUNK = 1024
-CHANNELS = 1
 RATE = 44100
-TARGET_DBFS = -25
-MAX_LOUDNESS = 103  # raw reading  would be -3
+BUTTON = 17
 
 
 class MagicHue:
-    def __init__(self, mac, version):
+    def __init__(self, mac, version, on_disconnect=None):
+        from magicblue import MagicBlue, Effect  # bluepy is slow to import, only needed once the bulb connects
+        self.magic_blue = MagicBlue
         self.mac = mac
         self.ver = version
+        self.on_disconnect = on_disconnect
+        self.reconnects = 0
         self.bulb = MagicBlue(self.mac, self.ver)
         self.bulb.connect()
         self.bulb.turn_off()  # Turn off the light
@@ -52,279 +53,441 @@ class MagicHue:
         self.bulb.set_effect(Effect.cyan_gradual_change, 20)
 
     def set_color(self, rgb):
-        if self.check():
-            try:
-                self.bulb.set_color(rgb)
-            except (RuntimeError, TypeError, NameError):
-                logging.warning("message")
+        """Sends the color, without checking the connection first (see BulbWriter), returns False if that failed"""
+        try:
+            self.bulb.set_color(rgb)
+            return True
+        except (RuntimeError, TypeError, NameError, OSError):
+            logging.warning('bulb set_color failed')
+            return False
 
     def check(self):
         if not self.bulb.test_connection():
             logging.warning('bulb not connected')
-            set_neos([2, 0, 0], [0, 0, 0], [0, 0, 0])
+            self.reconnects += 1
+            if self.on_disconnect is not None:
+                self.on_disconnect()
             if not self.bulb.connect():
-                self.bulb = MagicBlue(self.mac, self.ver)
+                self.bulb = self.magic_blue(self.mac, self.ver)
                 self.bulb.connect()
                 return self.bulb.test_connection()
         return True
 
-
-class RecordThread(threading.Thread):
-    def __init__(self, thread_id, name, counter):
-        threading.Thread.__init__(self)
-        self.threadID = thread_id
-        self.name = name
-        self.counter = counter
-
-    def run(self):
-        record(WAVE_FILENAME)
-
-
-class AnalyzeThread(threading.Thread):
-    def __init__(self, thread_id, name, counter):
-        threading.Thread.__init__(self)
-        self.threadID = thread_id
-        self.name = name
-        self.counter = counter
-
-    def run(self):
-        try:
-            if os.path.exists(WORK_FILENAME):
-                normalized_sound(WORK_FILENAME, NORM_WAV_FILENAME)
-                analyze(NORM_WAV_FILENAME)
-        except (RuntimeError, TypeError, NameError):
-            pass
-
-
-def record(file_name):
-    """Record from OS defined input source"""
-    global sample_time
-    frames = []
-    for i in range(0, int(RATE / CHUNK * sample_time)):
-        data = stream.read(CHUNK, exception_on_overflow=False)
-        frames.append(data)
-
-    wave_file = wave.open(file_name, 'wb')
-    wave_file.setnchannels(CHANNELS)
-    wave_file.setsampwidth(p.get_sample_size(FORMAT))
-    wave_file.setframerate(RATE)
-    wave_file.writeframes(b''.join(frames))
-    wave_file.close()
-
-
-def normalized_sound(source_file, target_file):
-    """Normalizes the provided source_file into the target_file"""
-    global decibel
-    sound = AudioSegment.from_wav(source_file)
-    decibel = sound.dBFS  # -3 is (maximum loudness)
-    normalized = sound.apply_gain(TARGET_DBFS - sound.dBFS)
-    return normalized.export(target_file, format="wav")
-
-
-def analyze(file):
-    """Computes EmotionProbabilities from the provided wave file"""
-    global decibel
-    (sample_rate, samples) = scipy.io.wavfile.read(file)
-    buffer_length = len(samples)
-    c_buffer = Vokaturi.SampleArrayC(buffer_length)
-    if samples.ndim == 1:  # mono
-        c_buffer[:] = samples[:] / 32768.0
-    else:  # stereo
-        c_buffer[:] = 0.5 * (samples[:, 0] + 0.0 + samples[:, 1]) / 32768.0
-
-    voice = Vokaturi.Voice(sample_rate, buffer_length)
-    voice.fill(buffer_length, c_buffer)
-    quality = Vokaturi.Quality()
-    ep = Vokaturi.EmotionProbabilities()
-    voice.extract(quality, ep)
-    a = ep if quality.valid and MAX_LOUDNESS + decibel > params.MIN_LOUDNESS else Vokaturi.EmotionProbabilities(0, 0, 0,
-                                                                                                                0, 0)
-    k, b = mavg(a)
-    show(k, b)
-    set_color(get_color(b))
-    voice.destroy()
-
-
-def mavg(a = Vokaturi.EmotionProbabilities(0, 0, 0, 0, 0)):
-    mavg.dic[mavg.index] = a
-    b = Vokaturi.EmotionProbabilities()
-    i = 0
-    for x in mavg.dic:
-        b.neutrality += x.neutrality
-        b.happiness += x.happiness
-        b.sadness += x.sadness
-        b.anger += x.anger
-        b.fear += x.fear
-        if x.neutrality != 0 or x.happiness != 0 or x.sadness != 0 or x.anger != 0 or b.fear != 0:
-            i += 1
-    if 0 < i:
-        b.neutrality /= i
-        b.happiness /= i
-        b.sadness /= i
-        b.anger /= i
-        b.fear /= i
-    mavg.index = mavg.index+1 if mavg.index+1 < len(mavg.dic) else 0
-    return i, b
-
-
-mavg.dic = []
-for i in range(params.MOVE_AVG):
-    mavg.dic.append(Vokaturi.EmotionProbabilities(0, 0, 0, 0, 0))
-mavg.index = 0
-
-
-def progress(count, total, status=''):
-    """Shows simple progress-bar style output"""
-    bar_len = 60
-    filled_len = int(round(bar_len * count / float(total)))
-    bar = '=' * filled_len + ' ' * (bar_len - filled_len)
-    sys.stdout.write('[%s] %s %3d\r\n' % (bar, status, count))
-
-
-def show(k, ep):
-    """Shows simple progress-bar style output in terminal: provided EmotionProbabilities, loudness, and samplet-ime"""
-    global decibel
-    global sample_time
-    progress(ep.neutrality * 100, 100, status='neutral')
-    progress(ep.happiness * 100, 100, status='happiness')
-    progress(ep.sadness * 100, 100, status='sadness')
-    progress(ep.anger * 100, 100, status='anger')
-    progress(ep.fear * 100, 100, status='fear')
-    sys.stdout.write('\r\n')
-    progress(min(100, 120 + decibel), 100, status='dBFS')
-    progress(int(k), 10, status='Moving Avg.')
-    sys.stdout.flush()
-    sys.stdout.write("\033[F")
-    sys.stdout.write("\033[F")
-    sys.stdout.write("\033[F")
-    sys.stdout.write("\033[F")
-    sys.stdout.write("\033[F")
-    sys.stdout.write("\033[F")
-    sys.stdout.write("\033[F")
-    sys.stdout.write("\033[F")
-
-
-def set_color(col):
-    """Set the bulb to the provided color, or dim the current color if provided color is 0,0,0"""
-    global prev_col
-    global hue
-    global dev
-    if col[0] == 0 and col[1] == 0 and col[2] == 0:
-        if prev_col[0] != 0 or prev_col[1] or prev_col[2] != 0:
-            col[0] = int(prev_col[0] / 4)
-            col[1] = int(prev_col[1] / 4)
-            col[2] = int(prev_col[2] / 4)
-    prev_col = col
-    hue.set_color(col)
-    set_neo(params.NEO_PIXELS, col)
-
-
-def set_neo(k, col):
-    """Set the neopixels 1..k to the provided color"""
-    d = params.MAX_NEO_VALUE / 255
-    for i in range(k):
-        dev.set_pixel(i, int(d * col[0]), int(d * col[1]), int(d * col[2]))
-    dev.show()
-
-
-def set_neos(col0, col1, col2):
-    """Set the neopixels to the provided colors"""
-    dev.set_pixel(0, col0[0], col0[1], col0[2])
-    dev.set_pixel(1, col1[0], col1[1], col1[2])
-    dev.set_pixel(2, col2[0], col2[1], col2[2])
-    dev.show()
-
-
-def get_color(ep):
-    """Returns a RGB color based on the provided EmotionProbabilities and params settings"""
-    if params.DISCRETE:  # only show strongest emotion
-        emo = 'neutrality'
-        m = ep.neutrality
-        if ep.happiness > m:
-            emo = 'happiness'
-            m = ep.happiness
-        if ep.sadness > m:
-            emo = 'sadness'
-            m = ep.sadness
-        if ep.anger > m:
-            emo = 'anger'
-            m = ep.anger
-        if ep.fear > m:
-            emo = 'fear'
-            m = ep.fear
-        col = copy.deepcopy(getattr(params, emo))
-        if params.RELATIVE:
-            m = math.sqrt(m)
-            col[0] = int(m * col[0])
-            col[1] = int(m * col[1])
-            col[2] = int(m * col[2])
-    else:
-        red = ep.neutrality * params.neutrality[0]
-        red += ep.happiness * params.happiness[0]
-        red += ep.sadness * params.sadness[0]
-        red += ep.anger * params.anger[0]
-        red += ep.fear * params.fear[0]
-
-        green = ep.neutrality * params.neutrality[1]
-        green += ep.happiness * params.happiness[1]
-        green += ep.sadness * params.sadness[1]
-        green += ep.anger * params.anger[1]
-        green += ep.fear * params.fear[1]
-
-        blue = ep.neutrality * params.neutrality[2]
-        blue += ep.happiness * params.happiness[2]
-        blue += ep.sadness * params.sadness[2]
-        blue += ep.anger * params.anger[2]
-        blue += ep.fear * params.fear[2]
-        col = [int(red), int(green), int(blue)]
-    return col
+    def close(self):
+        self.bulb.disconnect()
+
+
+class EmoLamp:
+    """
+    The application: owns the hardware and the analysis pipeline.
+
+    Nothing is touched on import. start() brings the hardware up in phases, connecting the bulb over
+    Bluetooth (the slowest part) on its own thread while the audio, SPI and GPIO are set up, so that
+    the neopixels show the first color without waiting for the bulb. The duration of every phase is
+    kept in `timings` (see startup_report()).
+
+    A zone (see params.ZONES and zones.py) is a dict overriding what the lamp uses: 'name', 'mac' (of the bulb,
+    None for no bulb), 'input_device' (PyAudio device index, None for the OS default), 'leds' (number of
+    neopixels, 0 for none), 'button' (poll the GPIO button), 'metrics_port', 'display' and 'log' (directory of
+    the emotion log, None for none).
+
+    The hardware can be replaced, e.g. by the stand-ins in fakes.py to run or benchmark the lamp anywhere:
+    `audio` returns a pyaudio.PyAudio-like object, `spi` is the SPI device of the neopixels, `bulb` returns
+    a MagicHue-like object for (mac, version, on_disconnect) and `vokaturi` loads the Vokaturi library.
+    """
+
+    def __init__(self, zone=None, audio=None, spi=None, bulb=None, vokaturi=None):
+        zone = zone or {}
+        self.audio_factory = audio
+        self.spi = spi
+        self.bulb_factory = bulb or MagicHue
+        self.load_library = vokaturi
+        self.config = settings = config.from_module(params)  # swapped as a whole when params.py changes
+        self.watcher = None
+        self.name = zone.get('name', 'lamp')
+        self.mac = zone.get('mac', settings.MAC_ADDRESS)
+        self.input_device = zone.get('input_device')
+        self.led_count = zone.get('leds', 3)
+        self.button = zone.get('button', True)
+        self.metrics_port = zone.get('metrics_port', settings.METRICS_PORT)
+        self.log_dir = zone.get('log', os.path.join(settings.EMOTION_LOG, self.name) if settings.EMOTION_LOG else None)
+        self.log = None
+        self.publish = None  # called with loudness, count, EmotionProbabilities and color of every result
+        self.window = adaptive.WindowController(settings.WINDOW_SECONDS, settings.HOP_SECONDS,
+                                                settings.MIN_WINDOW_SECONDS, settings.MAX_WINDOW_SECONDS,
+                                                settings.LATENCY_BUDGET, settings.MIN_VALID, settings.ADAPTIVE_WINDOW,
+                                                override_seconds=settings.WINDOW_OVERRIDE_SECONDS)
+        self.pressed = False  # button state at the last poll
+        self.decibel = 0.0
+        self.position = 0  # end of the last analyzed window in the ring buffer
+        self.timings = {}
+        self.started = None
+        self.gpio = None
+        self.dev = None
+        self.neo_lock = threading.Lock()  # the transition engine and the bulb writer both set neopixels
+        self.hue = None
+        self.writer = None
+        self.engine = None
+        self.audio = None
+        self.recorder = None
+        self.lamp = None
+        self.ring = None
+        self.channels = None  # CHANNELS and ANALYSIS_RATE of the config the pipeline was built with
+        self.analysis_rate = None
+        self.resample = None
+        self.selector = None
+        self.extractor = None
+        self.voices = Vokaturi.VoicePool()  # rebuilds its voice when the window length changes the buffer length
+        self.average = smoother.Smoother(settings.MOVE_AVG, settings.SMOOTHING, settings.EMA_SECONDS,
+                                         settings.HOP_SECONDS, settings.HYSTERESIS)
+        self.detect = vad.VoiceActivityDetector(RATE, settings.min_dbfs, settings.VAD_MAX_ZCR, settings.VAD_HANGOVER)
+        self.metrics = metrics.Metrics()
+        self.display = display.create(zone.get('display', settings.DISPLAY), settings.DISPLAY_RATE)
+
+    # Startup
+
+    def phase(self, name, func):
+        """Runs one startup phase and keeps its duration"""
+        t0 = time.monotonic()
+        func()
+        self.timings[name] = time.monotonic() - t0
+
+    def start(self):
+        """Brings up the hardware, the bulb in parallel, and starts the analysis"""
+        self.started = time.monotonic()
+        self.phase('leds', self.open_leds)
+        self.set_neos([1, 0, 0], [0, 1, 0], [0, 0, 1])
+        if self.mac:
+            threading.Thread(target=self.phase, args=('bulb', self.connect_bulb), name='connect', daemon=True).start()
+        self.phase('vokaturi', self.load_vokaturi)
+        if self.button:
+            self.phase('gpio', self.setup_gpio)
+        self.phase('pipeline', self.build_pipeline)
+        self.phase('audio', self.open_audio)
+        self.phase('metrics', self.start_metrics)
+        if self.log_dir:
+            self.phase('log', self.open_log)
+        self.watcher = config.Watcher(self.config, self.reconfigure)
+        self.watcher.start()
+        self.display.start()
+        self.engine.start()
+        self.recorder.start()
+        self.lamp.start()
+        self.timings['ready'] = time.monotonic() - self.started
+
+    def open_leds(self):
+        if self.led_count:
+            self.dev = apa102.APA102(num_led=self.led_count, spi=self.spi)
+
+    def load_vokaturi(self):
+        if self.load_library is not None:
+            self.load_library()
+            return
+        logging.info(platform.machine())  # Hardware 'pi3b.so' or 'piZero.so'
+        if platform.machine() == 'armv7l':
+            Vokaturi.load('./lib/pi3b.so')
+            logging.info('pi3b.so loaded')
+        else:
+            Vokaturi.load('./lib/piZero.so')
+            logging.info('piZero.so loaded')
+
+    def setup_gpio(self):
+        import RPi.GPIO as GPIO
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(BUTTON, GPIO.IN)
+        self.gpio = GPIO
+
+    def build_pipeline(self):
+        self.channels = self.config.CHANNELS
+        self.analysis_rate = self.config.ANALYSIS_RATE or RATE
+        self.ring = ringbuffer.RingBuffer(int(RATE * self.config.RING_SECONDS), self.channels)
+        self.resample = resampler.Resampler(RATE, self.analysis_rate)
+        top = min(self.config.CHANNEL_TOP, self.channels)
+        if 1 < self.channels:
+            self.selector = channels.ChannelSelector(RATE, top)
+        if 1 < top:
+            self.extractor = channels.ParallelExtractor(top, self.analysis_rate)
+        self.engine = transition.Transition([self.show_color], self.config.FRAME_RATE, self.config.TRANSITION_SECONDS,
+                                            self.config.FADE_SECONDS, self.config.EASING)
+        self.lamp = pipeline.Pipeline(self.config.QUEUE_SIZE, self.config.DROP_POLICY, self.metrics)
+        self.lamp.add('capture', self.next_window)
+        if self.config.VAD:
+            self.lamp.add('vad', self.gate)
+        if self.selector is not None:
+            self.lamp.add('select', self.selector)
+        if self.extractor is not None:  # the top channels travel with their weights
+            self.lamp.add('resample', self.resampled).add('normalize', self.normalized_channels)
+            self.lamp.add('extract', self.extract_channels)
+        else:
+            self.lamp.add('resample', self.resample).add('normalize', self.normalized_sound)
+            self.lamp.add('extract', self.extract)
+        self.lamp.add('smooth', self.smooth).add('output', self.output)
+
+    def open_audio(self):
+        import capture
+        if self.audio_factory is None:
+            import pyaudio
+            self.audio_factory = pyaudio.PyAudio
+        self.audio = self.audio_factory()
+        self.recorder = capture.Capture(self.audio, self.ring, RATE, self.channels, CHUNK, capture.paInt16,
+                                        self.input_device)
+
+    def start_metrics(self):
+        """Registers the counters kept by the components, serves and logs the metrics as configured in params"""
+        self.metrics.add_source('capture', lambda: self.recorder.counters())
+        self.metrics.add_source('queues', lambda: self.lamp.dropped())
+        self.metrics.add_source('bulb', lambda: {'reconnects': self.hue.reconnects, 'sent': self.writer.sent,
+                                                 'coalesced': self.writer.coalesced, 'skipped': self.writer.skipped})
+        self.metrics.add_source('light', lambda: {'frames': self.engine.frames})
+        self.metrics.add_source('window', self.window.counters)
+        self.metrics.add_source('config', lambda: {'reloads': self.watcher.reloads, 'errors': self.watcher.errors})
+        if self.selector is not None:
+            self.metrics.add_source('channels', lambda: {'snr_db': numpy.round(self.selector.scores, 1).tolist()})
+        if self.metrics_port:
+            try:
+                self.metrics.serve(self.metrics_port)
+            except OSError as e:  # e.g. the port is taken by zones.py, the lamp runs without the endpoint
+                logging.warning('metrics not served on port %d: %s' % (self.metrics_port, e))
+        if self.config.METRICS_LOG_SECONDS:
+            self.metrics.log_every(self.config.METRICS_LOG_SECONDS)
+
+    def open_log(self):
+        self.log = emolog.EmotionLog(self.log_dir, self.config.EMOTION_LOG_RECORDS)
+
+    def connect_bulb(self):
+        """Connects the bulb, retrying until it answers, then starts sending it the colors"""
+        counter = 0
+        delay = 1
+        while True:
+            try:
+                hue = self.bulb_factory(self.mac, self.config.BULB_VERSION, self.bulb_lost)
+                if hue.check():
+                    break
+                time.sleep(1)
+            except Exception:
+                col = [0, 0, 0]
+                counter = (counter + 1) % 3  # 0,1,2
+                col[counter] = 1
+                self.set_neos(col, [0, 1, 0], [0, 0, 1])
+                time.sleep(delay)  # e.g. the Bluetooth adapter is down, do not keep a core busy retrying
+                delay = min(30, 2 * delay)
+        self.hue = hue
+        self.writer = bulbwriter.BulbWriter(hue, self.config.BULB_MIN_INTERVAL, self.config.BULB_MIN_DELTA,
+                                            self.config.BULB_CHECK_SECONDS)
+        self.writer.start()
+
+    def bulb_lost(self):
+        self.set_neos([2, 0, 0], [0, 0, 0], [0, 0, 0])
+
+    def startup_report(self):
+        """Returns the duration of every startup phase, and the time to the first color, in one line"""
+        return 'startup: ' + ', '.join('%s %.2f s' % (name, t) for name, t in self.timings.items())
+
+    def shutdown(self):
+        """Stops the pipeline and releases the audio stream, SPI device and bulb"""
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.lamp is not None:
+            self.lamp.shutdown()
+        if self.engine is not None:
+            self.engine.stop()
+        self.display.stop()
+        if self.recorder is not None:
+            self.recorder.stop()
+            self.recorder.close()
+        if self.audio is not None:
+            self.audio.terminate()
+        self.voices.clear()
+        if self.extractor is not None:
+            self.extractor.clear()
+        if self.dev is not None:
+            self.dev.clear_strip()
+            self.dev.cleanup()
+        if self.writer is not None:
+            self.writer.stop()
+        if self.log is not None:
+            self.log.close()
+        if self.hue is not None:
+            self.hue.close()
+        if self.gpio is not None:
+            self.gpio.cleanup()
+
+    def reconfigure(self, config):
+        """Swaps in a reloaded config snapshot and applies it to the running components, without stopping them"""
+        old, self.config = self.config, config
+        self.detect.configure(config.min_dbfs, config.VAD_MAX_ZCR, config.VAD_HANGOVER)
+        if any(getattr(old, k) != getattr(config, k) for k in ('MOVE_AVG', 'SMOOTHING', 'EMA_SECONDS', 'HYSTERESIS')):
+            self.average = smoother.Smoother(config.MOVE_AVG, config.SMOOTHING, config.EMA_SECONDS, self.window.hop,
+                                             config.HYSTERESIS)
+        window = self.window
+        window.min_seconds, window.max_seconds = config.MIN_WINDOW_SECONDS, config.MAX_WINDOW_SECONDS
+        window.min_hop, window.budget, window.min_valid = config.HOP_SECONDS, config.LATENCY_BUDGET, config.MIN_VALID
+        window.adaptive, window.override_seconds = config.ADAPTIVE_WINDOW, config.WINDOW_OVERRIDE_SECONDS
+        window.seconds = window.bounded(window.seconds if config.ADAPTIVE_WINDOW else config.WINDOW_SECONDS)
+        if not config.ADAPTIVE_WINDOW:
+            window.hop = config.HOP_SECONDS
+        if self.engine is not None:
+            self.engine.frame_time = 1.0 / config.FRAME_RATE
+            self.engine.duration, self.engine.fade = config.TRANSITION_SECONDS, config.FADE_SECONDS
+            self.engine.ease = transition.EASINGS[config.EASING]
+        if self.writer is not None:
+            self.writer.min_interval, self.writer.min_delta = config.BULB_MIN_INTERVAL, config.BULB_MIN_DELTA
+            self.writer.check_interval = config.BULB_CHECK_SECONDS
+
+    # Pipeline stages
+
+    def dump(self, file_name, frames, rate=RATE, channels=1):
+        """Writes the provided raw frames into a wave file, for debugging only"""
+        wave_file = wave.open(file_name, 'wb')
+        wave_file.setnchannels(channels)
+        wave_file.setsampwidth(SAMPLE_WIDTH)
+        wave_file.setframerate(rate)
+        wave_file.writeframes(frames)
+        wave_file.close()
+
+    def next_window(self):
+        """Waits for the next window, one hop after the last one (both as set by the window controller)"""
+        window = min(int(RATE * self.window.seconds), self.ring.size)
+        position = max(self.position + int(RATE * self.window.hop), window)
+        written = self.ring.wait(position, timeout=0.5)
+        if written < position:
+            return None  # no sound yet, let the stage check if it got stopped
+        self.position = written  # if analysis fell behind, this skips ahead to the newest window
+        if self.gpio is not None:
+            pressed = not self.gpio.input(BUTTON)
+            if pressed and not self.pressed:  # once per press, not per poll
+                self.window.press()
+            self.pressed = pressed
+        t0 = time.perf_counter()
+        samples = self.ring.read(window, written)
+        self.metrics.observe('capture', time.perf_counter() - t0)
+        self.metrics.count('windows')
+        if self.config.DEBUG_DUMP:
+            self.dump(WAVE_FILENAME, samples.tobytes(), RATE, self.channels)
+        return samples
+
+    def gate(self, samples):
+        """Lets the samples pass on if they may contain speech, otherwise adds a zero observation to the average"""
+        if self.detect(samples):
+            return samples
+        self.metrics.count('vad_skipped')
+        loudness = max(self.detect.dbfs, analysis.SILENCE_DBFS)
+        silence = (loudness, Vokaturi.Quality(), Vokaturi.EmotionProbabilities(0, 0, 0, 0, 0))
+        return pipeline.Bypass('smooth', silence)  # skips resampling, normalization and extraction
+
+    def normalized_sound(self, samples):
+        """Normalizes the provided int16 scaled samples, returns loudness in dBFS and float64 samples"""
+        decibel, normalized = analysis.normalize(samples)
+        if self.config.DEBUG_DUMP:
+            self.dump(NORM_WAV_FILENAME, (normalized * 32767).astype(numpy.int16).tobytes(), self.analysis_rate,
+                      1 if normalized.ndim == 1 else normalized.shape[1])
+        return decibel, normalized
+
+    def resampled(self, item):
+        """Resamples the top channels, keeping their weights"""
+        weights, samples = item
+        return weights, self.resample(samples)
+
+    def normalized_channels(self, item):
+        """Normalizes every one of the top channels on its own, the loudness is the one of the best channel"""
+        weights, samples = item
+        normalized = [analysis.normalize(samples[:, c]) for c in range(samples.shape[1])]
+        if self.config.DEBUG_DUMP:  # the best channel
+            self.dump(NORM_WAV_FILENAME, (normalized[0][1] * 32767).astype(numpy.int16).tobytes(),
+                      self.analysis_rate)
+        return normalized[0][0], [n for _, n in normalized], weights
+
+    def extract(self, item):
+        """Computes EmotionProbabilities from the provided loudness and normalized float64 samples"""
+        loudness, samples = item
+        t0 = time.perf_counter()
+        quality, a = analysis.extract(self.voices, self.analysis_rate, samples, loudness, self.config.MIN_LOUDNESS)
+        return self.counted(loudness, quality, a, time.perf_counter() - t0)
+
+    def extract_channels(self, item):
+        """Computes the EmotionProbabilities of the top channels in parallel, fused by the channel weights"""
+        loudness, samples, weights = item
+        t0 = time.perf_counter()
+        quality, a = self.extractor(samples, weights, loudness, self.config.MIN_LOUDNESS)
+        return self.counted(loudness, quality, a, time.perf_counter() - t0)
+
+    def counted(self, loudness, quality, a, cost):
+        """Counts the result, and lets the window controller know how it went"""
+        self.window.observe(quality.valid and 0 < quality.num_frames_analyzed, cost)
+        self.metrics.count('valid' if quality.valid else 'invalid')
+        self.metrics.count('frames_analyzed', quality.num_frames_analyzed)
+        self.metrics.count('frames_lost', quality.num_frames_lost)
+        return loudness, quality, a
+
+    def smooth(self, item):
+        """Adds the provided EmotionProbabilities to the moving average"""
+        loudness, quality, a = item
+        if self.average.interval != self.window.hop:
+            self.average.set_interval(self.window.hop)
+        k, b = self.average.update(a)
+        return loudness, k, b, quality, a
+
+    def output(self, item):
+        """Shows the moving average on the display, sets bulb and neopixels to its color and logs the result"""
+        self.decibel, k, b, quality, a = item
+        self.display.update(k, b, self.decibel)
+        col = self.get_color(b)
+        if self.log is not None:
+            self.log.append(time.time(), a, self.decibel, quality, col)
+        if self.publish is not None:
+            self.publish(self.decibel, k, b, col)
+        self.set_color(col)
+
+    # Light
+
+    def get_color(self, ep):
+        """Returns a RGB color based on the provided EmotionProbabilities and params settings"""
+        return self.config.palette.color(ep)
+
+    def set_color(self, col):
+        """Set the bulb and neopixels to the provided color, or fade them to dark if provided color is 0,0,0"""
+        self.engine.set_target(col)
+
+    def show_color(self, col):
+        """Shows one frame of the color transition on the bulb (once connected) and the neopixels"""
+        if 'first color' not in self.timings and any(col):
+            self.timings['first color'] = time.monotonic() - self.started
+            logging.info(self.startup_report())
+        t0 = time.perf_counter()
+        if self.writer is not None:
+            self.writer.put(col)
+        self.set_neo(self.config.NEO_PIXELS, col)
+        self.metrics.observe('show', time.perf_counter() - t0)
+
+    def set_neo(self, k, col):
+        """Set the neopixels 1..k to the provided color"""
+        if self.dev is None:
+            return
+        d = self.config.neo_scale
+        with self.neo_lock:
+            self.dev.fill(int(d * col[0]), int(d * col[1]), int(d * col[2]), count=k)
+            self.dev.show()
+
+    def set_neos(self, col0, col1, col2):
+        """Set the neopixels to the provided colors"""
+        if self.dev is None:
+            return
+        with self.neo_lock:
+            self.dev.set_pixels([col0, col1, col2])
+            self.dev.show()
 
 
-BUTTON = 17
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(BUTTON, GPIO.IN)
-sample_time = params.RECORD_SECONDS
-prev_color = [0, 0, 0]
-decibel = 0.0
-dev = apa102.APA102(num_led=3)
-p = pyaudio.PyAudio()
-stream = p.open(format=FORMAT,
-                channels=CHANNELS,
-                rate=RATE,
-                input=True,
-                frames_per_buffer=CHUNK)
-
 if __name__ == "__main__":
-    global hue
-    os.system('clear')
-    set_neos([1, 0, 0], [0, 1, 0], [0, 0, 1])
-    while True:
-        counter = 1
-        try:
-            hue = MagicHue(params.MAC_ADDRESS, params.BULB_VERSION)
-            if hue.check():
-                break
-            time.sleep(1)
-        except Exception as e:
-            col = [0, 0, 0]
-            counter = (counter + 1) % 3  # 0,1,2
-            col[counter] = 1
-            set_neos(col, [0, 1, 0], [0, 0, 1])
-            pass
-    set_neos([0, 1, 0], [0, 1, 0], [0, 1, 0])
+    app = EmoLamp()
+    status = 0
     try:
-        while True:
-            thread1 = RecordThread(1, "Recorder", 1)
-            thread2 = AnalyzeThread(2, "Analyzer", 2)
-            thread1.start()
-            thread2.start()
-            thread1.join()
-            thread2.join()
-            if os.path.exists(WAVE_FILENAME):
-                os.rename(WAVE_FILENAME, WORK_FILENAME)
-            if not GPIO.input(BUTTON):
-                sample_time += 0.1
-    except (RuntimeError, TypeError, NameError):
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
+        app.start()
+        while app.lamp.alive():
+            time.sleep(1)
+        logging.error('a pipeline stage died, exiting')
+        status = 1  # lets systemd (or whoever started the lamp) restart it
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.shutdown()
+    sys.exit(status)
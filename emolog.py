@@ -0,0 +1,211 @@
+# emolog.py
+# Compact on-device log of the analysis results, in fixed size memory-mapped ring files; never any audio
+# Usage: python3 emolog.py [--dir emotions/lamp] [--minutes | --hours] [--last SECONDS]
+
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+import numpy
+from smoother import EMOTIONS
+
+MAGIC = b'EMOLOG1'  # padded with a zero byte to 8
+HEADER = numpy.dtype([('magic', 'S8'), ('capacity', '<u8'), ('written', '<u8'), ('record_size', '<u8')])
+HEADER_SIZE = 64
+MAX_CLOCK_STEP = 60  # seconds the clock may step back before a result is logged at its own time, see append()
+
+RECORD = numpy.dtype([('time', '<f8'), ('ep', '<f4', 5), ('dbfs', '<f4'), ('frames', '<u2'), ('valid', 'u1'),
+                      ('rgb', 'u1', 3), ('pad', 'V2')])  # 40 bytes per analyzed window
+SUMMARY = numpy.dtype([('time', '<f8'), ('ep', '<f4', 5), ('dbfs', '<f4'), ('windows', '<u4'), ('valid', '<u4'),
+                       ('rgb', 'u1', 3), ('pad', 'V5')])  # 48 bytes per minute or hour
+
+
+class RingFile:
+    """
+    Fixed size file of `capacity` records, written in a circle: once full, every record overwrites the oldest.
+    The header keeps the number of records ever written, updated after the record itself, so that a reader
+    (or the next start after a crash) never sees a half written record. Records are in the order written,
+    which is time order unless the clock was set back by more than MAX_CLOCK_STEP. A capacity of None opens
+    an existing file as it is.
+    """
+
+    def __init__(self, path, dtype, capacity=None):
+        if capacity is None:
+            capacity = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+        if not os.path.exists(path) or os.path.getsize(path) != HEADER_SIZE + capacity * dtype.itemsize:
+            with open(path, 'wb') as f:  # new, or created with another capacity: start over
+                f.truncate(HEADER_SIZE + capacity * dtype.itemsize)
+            header = numpy.memmap(path, HEADER, 'r+', 0, 1)
+            header[0] = (MAGIC, capacity, 0, dtype.itemsize)
+            header.flush()
+            del header
+        self.header = numpy.memmap(path, HEADER, 'r+', 0, 1)
+        if self.header['magic'][0] != MAGIC or self.header['record_size'][0] != dtype.itemsize:
+            raise ValueError('%s is not a log of %d byte records' % (path, dtype.itemsize))
+        self.records = numpy.memmap(path, dtype, 'r+', HEADER_SIZE, capacity)
+        self.capacity = capacity
+
+    @property
+    def written(self):
+        return int(self.header['written'][0])
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def append(self, record):
+        written = self.written
+        self.records[written % self.capacity] = record
+        self.header['written'] = written + 1
+
+    def segments(self):
+        """Returns the records as (older, newer) views, each in the order written"""
+        written = self.written
+        if written <= self.capacity:
+            return self.records[:0], self.records[:written]
+        i = written % self.capacity
+        return self.records[i:], self.records[:i]
+
+    def query(self, start=-math.inf, end=math.inf):
+        """Returns a copy of the records with start <= time < end, in the order written"""
+        parts = []
+        for segment in self.segments():  # a scan, not a binary search: the clock may have been set back
+            times = segment['time']
+            parts.append(segment[(start <= times) & (times < end)])
+        return numpy.concatenate(parts)
+
+    def flush(self):
+        self.records.flush()
+        self.header.flush()
+
+
+class Summary:
+    """Running sums of the records of one minute or hour, turned into a SUMMARY record when it is over"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.start = None
+        self.ep = numpy.zeros(5)
+        self.dbfs = 0.0
+        self.windows = 0
+        self.valid = 0
+        self.rgb = numpy.zeros(3)
+
+    def add(self, records):
+        """Adds a RECORD, or an array of them"""
+        records = numpy.atleast_1d(records)
+        valid = records['valid'].astype(bool)
+        self.ep += records['ep'][valid].sum(axis=0)
+        self.dbfs += float(records['dbfs'].sum())
+        self.windows += len(records)
+        self.valid += int(valid.sum())
+        self.rgb += records['rgb'].sum(axis=0)
+
+    def record(self):
+        """Returns the SUMMARY record: probabilities averaged over the valid windows, the rest over all"""
+        record = numpy.zeros((), SUMMARY)
+        record['time'] = self.start
+        record['ep'] = self.ep / max(1, self.valid)
+        record['dbfs'] = self.dbfs / max(1, self.windows)
+        record['windows'] = self.windows
+        record['valid'] = self.valid
+        record['rgb'] = numpy.round(self.rgb / max(1, self.windows))
+        return record
+
+    def reset(self, start):
+        self.__init__(self.seconds)
+        self.start = start
+
+
+class EmotionLog:
+    """
+    Keeps a record of every analysis result (time, emotion probabilities, loudness, quality, color shown)
+    in `directory`, in three ring files: windows.log with the last `capacity` results, and minutes.log and
+    hours.log with per minute and per hour summaries. The summaries are kept up to date with every record,
+    nothing is ever recomputed from the windows, except the last minute and hour after a restart.
+    Capacities of None open an existing log as it is, e.g. to read it while the lamp is writing it.
+    """
+
+    def __init__(self, directory, capacity=1000000, minutes=60 * 24 * 31, hours=24 * 366):
+        os.makedirs(directory, exist_ok=True)
+        self.windows = RingFile(os.path.join(directory, 'windows.log'), RECORD, capacity)
+        self.minutes = RingFile(os.path.join(directory, 'minutes.log'), SUMMARY, minutes)
+        self.hours = RingFile(os.path.join(directory, 'hours.log'), SUMMARY, hours)
+        self.minute = Summary(60)
+        self.hour = Summary(3600)
+        written = self.windows.written
+        self.last = float(self.windows.records[(written - 1) % self.windows.capacity]['time']) if written else -math.inf
+        for summary in (self.minute, self.hour):  # resume the summaries cut off by the last stop
+            start = self.last if written else time.time()
+            summary.reset(start // summary.seconds * summary.seconds)
+            summary.add(self.windows.query(summary.start, summary.start + summary.seconds))
+
+    def append(self, t, ep, dbfs, quality, rgb):
+        """
+        Adds one analysis result. A time up to MAX_CLOCK_STEP before the last one (e.g. an NTP correction) is
+        taken as the last one; a larger step back is taken as is, as the start of a new epoch, so that one
+        wrong time far in the future cannot pin all records after it.
+        """
+        if self.last - MAX_CLOCK_STEP <= t < self.last:
+            t = self.last
+        self.last = t
+        record = numpy.zeros((), RECORD)
+        record['time'] = t
+        record['ep'] = [ep.neutrality, ep.happiness, ep.sadness, ep.anger, ep.fear]
+        record['dbfs'] = dbfs
+        record['frames'] = min(quality.num_frames_analyzed, 65535)
+        record['valid'] = quality.valid
+        record['rgb'] = rgb
+        for summary, ring in ((self.minute, self.minutes), (self.hour, self.hours)):
+            if not summary.start <= t < summary.start + summary.seconds:
+                if summary.windows:
+                    ring.append(summary.record())
+                summary.reset(t // summary.seconds * summary.seconds)
+            summary.add(record)
+        self.windows.append(record)
+
+    def query(self, start=-math.inf, end=math.inf):
+        """Returns the window records with start <= time < end"""
+        return self.windows.query(start, end)
+
+    def summaries(self, seconds=60, start=-math.inf, end=math.inf):
+        """Returns the per minute (seconds=60) or per hour (3600) summaries with start <= time < end"""
+        ring, current = (self.minutes, self.minute) if seconds == 60 else (self.hours, self.hour)
+        records = ring.query(start, end)
+        if current.windows and start <= current.start < end:  # the summary so far of the current minute or hour
+            records = numpy.concatenate((records, current.record()[None]))
+        return records
+
+    def close(self):
+        for ring in (self.windows, self.minutes, self.hours):
+            ring.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prints the emotion log of a lamp as CSV')
+    parser.add_argument('--dir', default=os.path.join('emotions', 'lamp'), help='log directory')
+    parser.add_argument('--minutes', action='store_true', help='print the per minute summaries')
+    parser.add_argument('--hours', action='store_true', help='print the per hour summaries')
+    parser.add_argument('--last', type=float, default=3600, help='print the last that many seconds')
+    args = parser.parse_args()
+
+    log = EmotionLog(args.dir, None, None, None)
+    start = time.time() - args.last
+    out = csv.writer(sys.stdout)
+    if args.minutes or args.hours:
+        records = log.summaries(3600 if args.hours else 60, start)
+        out.writerow(['time'] + list(EMOTIONS) + ['dbfs', 'windows', 'valid', 'red', 'green', 'blue'])
+        for r in records:
+            out.writerow([round(r['time'], 3)] + [round(float(p), 4) for p in r['ep']] +
+                         [round(float(r['dbfs']), 2), r['windows'], r['valid']] + r['rgb'].tolist())
+    else:
+        records = log.query(start)
+        out.writerow(['time'] + list(EMOTIONS) + ['dbfs', 'frames', 'valid', 'red', 'green', 'blue'])
+        for r in records:
+            out.writerow([round(r['time'], 3)] + [round(float(p), 4) for p in r['ep']] +
+                         [round(float(r['dbfs']), 2), r['frames'], r['valid']] + r['rgb'].tolist())
+
+
+if __name__ == "__main__":
+    main()
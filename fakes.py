@@ -0,0 +1,230 @@
+# fakes.py
+# Stand-in backends for the hardware and the ARM-only Vokaturi library, to run and measure the lamp on any computer
+
+import ctypes
+import math
+import threading
+import time
+import numpy
+import scipy.io.wavfile
+import Vokaturi
+
+
+class SyntheticAudio:
+    """
+    Endless, deterministic audio source with the read() interface of a PyAudio input stream.
+    Alternates `speech_seconds` of a voice-like harmonic tone with `pause_seconds` of faint noise.
+    """
+
+    def __init__(self, rate=44100, channels=1, speech_seconds=2.0, pause_seconds=1.0, seed=0):
+        self.rate = rate
+        self.channels = channels
+        t = numpy.arange(int(speech_seconds * rate)) / rate
+        pitch = 150 + 50 * numpy.sin(2 * numpy.pi * 0.5 * t)  # slowly gliding pitch
+        phase = 2 * numpy.pi * numpy.cumsum(pitch) / rate
+        speech = sum(numpy.sin(k * phase) / k for k in range(1, 12)) * (0.6 + 0.4 * numpy.sin(2 * numpy.pi * 3 * t))
+        noise = numpy.random.RandomState(seed).normal(0, 1, int((speech_seconds + pause_seconds) * rate))
+        signal = numpy.concatenate((8000 * speech, numpy.zeros(int(pause_seconds * rate)))) + 30 * noise
+        self.samples = numpy.repeat(signal.astype(numpy.int16), channels)
+        self.position = 0
+
+    def read(self, frames, exception_on_overflow=False):
+        """Returns the next frames as raw interleaved int16 bytes, starting over at the end"""
+        n = frames * self.channels
+        index = numpy.arange(self.position, self.position + n) % len(self.samples)
+        self.position = (self.position + n) % len(self.samples)
+        return self.samples[index].tobytes()
+
+
+class ReplayAudio(SyntheticAudio):
+    """Endless audio source replaying a recorded (int16) WAV file"""
+
+    def __init__(self, path):
+        self.rate, samples = scipy.io.wavfile.read(path)
+        self.channels = 1 if samples.ndim == 1 else samples.shape[1]
+        self.samples = samples.astype(numpy.int16).ravel()
+        self.position = 0
+
+
+class FakePyAudio:
+    """
+    Stand-in for pyaudio.PyAudio, for EmoLamp(audio=...): its input streams call back with chunks read from
+    `source` (e.g. SyntheticAudio), on their own thread and at the pace of real time, times `speed`.
+    """
+
+    def __init__(self, source, speed=1.0):
+        self.source = source
+        self.speed = speed
+        self.streams = []
+
+    def open(self, format, channels, rate, input=True, frames_per_buffer=1024, stream_callback=None, start=True,
+             input_device_index=None):
+        if channels != self.source.channels or rate != self.source.rate:
+            raise ValueError('the source has %d channels at %d Hz, not %d at %d Hz' %
+                             (self.source.channels, self.source.rate, channels, rate))
+        stream = FakeStream(self.source, frames_per_buffer, stream_callback, self.speed)
+        self.streams.append(stream)
+        if start:
+            stream.start_stream()
+        return stream
+
+    def terminate(self):
+        for stream in self.streams:
+            stream.close()
+
+
+class FakeStream:
+    """Callback mode input stream of a FakePyAudio"""
+
+    def __init__(self, source, chunk, callback, speed=1.0):
+        self.source = source
+        self.chunk = chunk
+        self.callback = callback
+        self.interval = chunk / source.rate / speed
+        self.chunks = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        next_time = time.perf_counter()
+        while not self._stopped.is_set():
+            self.callback(self.source.read(self.chunk), self.chunk, {}, 0)
+            self.chunks += 1
+            next_time += self.interval
+            self._stopped.wait(max(0.0, next_time - time.perf_counter()))
+
+    def start_stream(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='fake-audio', daemon=True)
+        self._thread.start()
+
+    def stop_stream(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def close(self):
+        self.stop_stream()
+
+
+class FakeVokaturiLibrary:
+    """
+    Deterministic stand-in for the Vokaturi C library, installed with use_fake_vokaturi().
+    Emotions are derived from loudness and zero-crossing rate. Optionally burns `cost` seconds
+    of CPU per second of analyzed audio, to mimic the load of the real library.
+    """
+
+    def __init__(self, cost=0.0):
+        self.cost = cost
+        self.voices = {}
+        self._next = 1
+
+    def VokaturiVoice_create(self, sample_rate, buffer_length):
+        handle = self._next
+        self._next += 1
+        self.voices[handle] = {'rate': sample_rate, 'samples': numpy.zeros(0)}
+        return handle
+
+    def VokaturiVoice_setRelativePriorProbabilities(self, voice, priorEmotionProbabilities):
+        pass
+
+    def VokaturiVoice_fill(self, voice, num_samples, samples):
+        if isinstance(samples, ctypes.Array):
+            data = numpy.frombuffer(samples, dtype=numpy.float64, count=num_samples)
+        else:
+            data = numpy.ctypeslib.as_array(samples, shape=(num_samples,))
+        self.voices[voice]['samples'] = numpy.array(data)
+
+    def VokaturiVoice_extract(self, voice, quality, emotionProbabilities):
+        v = self.voices[voice]
+        x = v['samples']
+        if self.cost:
+            deadline = time.perf_counter() + self.cost * len(x) / v['rate']
+            while time.perf_counter() < deadline:
+                pass
+        q, ep = getattr(quality, '_obj', quality), getattr(emotionProbabilities, '_obj', emotionProbabilities)
+        frames = len(x) * 100 // int(v['rate'])  # Vokaturi analyzes 10 ms frames
+        q.num_frames_analyzed, q.num_frames_lost = frames, 0
+        rms = math.sqrt(float(numpy.dot(x, x)) / len(x)) if len(x) else 0.0
+        q.valid = int(0.001 < rms)
+        if not q.valid:
+            return
+        zcr = numpy.count_nonzero(numpy.signbit(x[1:]) != numpy.signbit(x[:-1])) / len(x)
+        p = numpy.array([1.0, 4 * rms, 0.5 * (1 - rms), 20 * zcr, 0.2])
+        p /= p.sum()
+        ep.neutrality, ep.happiness, ep.sadness, ep.anger, ep.fear = p
+
+    def VokaturiVoice_reset(self, voice):
+        self.voices[voice]['samples'] = numpy.zeros(0)
+
+    def VokaturiVoice_destroy(self, voice):
+        self.voices.pop(voice, None)
+
+    def Vokaturi_versionAndLicense(self):
+        return b'fake Vokaturi for benchmarks and tests'
+
+
+def use_fake_vokaturi(cost=0.0):
+    """Makes the Vokaturi module use a FakeVokaturiLibrary instead of a loaded shared library"""
+    Vokaturi._library = FakeVokaturiLibrary(cost)
+    return Vokaturi._library
+
+
+class RecordingSpiDev:
+    """Stand-in for spidev.SpiDev that records what was sent"""
+
+    def __init__(self):
+        self.max_speed_hz = 0
+        self.transfers = 0
+        self.bytes_sent = 0
+        self.last = b''
+        self.opened = False
+
+    def open(self, bus, device):
+        self.opened = True
+
+    def xfer2(self, values):
+        self.transfers += 1
+        self.bytes_sent += len(values)
+        self.last = bytes(values)
+        return [0] * len(values)
+
+    def writebytes2(self, values):
+        self.transfers += 1
+        self.bytes_sent += len(values)
+        self.last = bytes(values)
+
+    def close(self):
+        self.opened = False
+
+
+class FakeBulb:
+    """Stand-in for MagicHue, each Bluetooth round trip takes `latency` seconds"""
+
+    def __init__(self, latency=0.05, connected=True, on_disconnect=None):
+        self.latency = latency
+        self.connected = connected
+        self.on_disconnect = on_disconnect
+        self.reconnects = 0
+        self.colors = []
+        self.write_times = []
+        self._lock = threading.Lock()
+
+    def set_color(self, rgb):
+        t0 = time.perf_counter()
+        time.sleep(self.latency)
+        with self._lock:
+            self.colors.append(list(rgb))
+            self.write_times.append(time.perf_counter() - t0)
+        return self.connected
+
+    def check(self):
+        time.sleep(self.latency)
+        if not self.connected:
+            self.reconnects += 1
+            if self.on_disconnect is not None:
+                self.on_disconnect()
+        return self.connected
+
+    def close(self):
+        pass
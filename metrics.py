@@ -0,0 +1,128 @@
+# metrics.py
+# Hot path instrumentation: stage latency histograms and counters, served as JSON on localhost and/or logged
+
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = [0.0001 * 2 ** i for i in range(18)]  # upper bounds in seconds: 0.1 ms .. 13 s
+
+
+class Histogram:
+    """Latency histogram with fixed, exponentially growing buckets; observe() is O(log buckets) and allocation free"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.max < seconds:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Returns the upper bound of the bucket holding the q-quantile (at most the largest value observed)"""
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if rank <= seen:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {'count': self.count,
+                'mean_ms': round(1000 * self.total / self.count, 3) if self.count else 0.0,
+                'p50_ms': round(1000 * self.quantile(0.5), 3),
+                'p95_ms': round(1000 * self.quantile(0.95), 3),
+                'max_ms': round(1000 * self.max, 3),
+                'buckets_ms': {'%g' % (1000 * b): n for b, n in zip(BUCKETS + [float('inf')], self.counts) if n}}
+
+
+class Metrics:
+    """
+    Collects stage latencies (observe) and event counters (count) from the running lamp, and reads the counters
+    other components keep themselves (capture overflows, bulb reconnects, ...) through sources added with
+    add_source(), only when a snapshot is taken.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.histograms = {}
+        self.counters = {}
+        self.sources = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_source(self, name, func):
+        """Adds a function returning a dict of values, which is included in every snapshot"""
+        self.sources[name] = func
+
+    def snapshot(self):
+        uptime = time.monotonic() - self.started
+        with self._lock:
+            counters = dict(self.counters)
+            stages = {name: h.snapshot() for name, h in self.histograms.items()}
+        windows = counters.get('windows', 0)
+        skipped = counters.get('vad_skipped', 0)
+        analyzed = counters.get('frames_analyzed', 0)
+        lost = counters.get('frames_lost', 0)
+        extracted = counters.get('valid', 0) + counters.get('invalid', 0)
+        result = {'uptime_s': round(uptime, 1),
+                  'windows_per_s': round(windows / uptime, 2) if uptime else 0.0,
+                  'vad_skip_ratio': round(skipped / windows, 3) if windows else 0.0,
+                  'valid_ratio': round(counters.get('valid', 0) / extracted, 3) if extracted else 0.0,
+                  'frames_lost_ratio': round(lost / (analyzed + lost), 3) if analyzed + lost else 0.0,
+                  'counters': counters,
+                  'stages': stages}
+        for name, func in list(self.sources.items()):
+            try:
+                result[name] = func()
+            except (AttributeError, TypeError, ValueError):
+                result[name] = None  # component not (yet) running
+        return result
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serves the snapshot as JSON on http://host:port/ from a daemon thread, returns the server"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(metrics.snapshot(), indent=1).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # no access log
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        return server
+
+    def log_every(self, seconds):
+        """Logs the snapshot every `seconds`, from a daemon thread"""
+        def run():
+            while True:
+                time.sleep(seconds)
+                logging.info('metrics ' + json.dumps(self.snapshot(), separators=(',', ':')))
+        threading.Thread(target=run, name='metrics-log', daemon=True).start()
@@ -0,0 +1,46 @@
+# palette.py
+# Maps EmotionProbabilities to RGB colors, using the emotion colors from params compiled into a 5x3 matrix
+
+import numpy
+from smoother import EMOTIONS
+
+
+class Palette:
+    """
+    Emotion to color mapping, compiled once.
+
+    Mixed mode: the color is the probability weighted sum of the emotion colors, i.e. probabilities @ matrix.
+    Discrete mode: the color of the strongest emotion, in relative mode scaled by the square root of its probability.
+    color() maps one EmotionProbabilities, colors() maps an (N x 5) array of probabilities to an (N x 3) array.
+    """
+
+    def __init__(self, colors, discrete=False, relative=True):
+        self.matrix = numpy.array(colors, dtype=numpy.float64).reshape(len(EMOTIONS), 3)
+        self.discrete = discrete
+        self.relative = relative
+        self._lookup = [[int(c) for c in row] for row in self.matrix]  # discrete, not relative: color by emotion
+
+    @classmethod
+    def from_params(cls, params):
+        return cls([getattr(params, emo) for emo in EMOTIONS], params.DISCRETE, params.RELATIVE)
+
+    def color(self, ep):
+        """Returns the [red, green, blue] color for the provided EmotionProbabilities"""
+        x = numpy.array([ep.neutrality, ep.happiness, ep.sadness, ep.anger, ep.fear])
+        if not self.discrete:
+            return [int(c) for c in x @ self.matrix]
+        i = int(x.argmax())  # first one wins a tie, neutrality before happiness, ...
+        if not self.relative:
+            return list(self._lookup[i])
+        return [int(c) for c in numpy.sqrt(x[i]) * self.matrix[i]]
+
+    def colors(self, probabilities):
+        """Returns the (N x 3) int array of colors for the provided (N x 5) array of probabilities"""
+        p = numpy.asarray(probabilities, dtype=numpy.float64).reshape(-1, len(EMOTIONS))
+        if not self.discrete:
+            return (p @ self.matrix).astype(int)
+        i = p.argmax(axis=1)
+        rgb = self.matrix[i]
+        if self.relative:
+            rgb = numpy.sqrt(p[numpy.arange(len(p)), i])[:, None] * rgb
+        return rgb.astype(int)
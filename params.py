@@ -4,15 +4,79 @@ MAC_ADDRESS = 'f8:1d:78:63:45:9d'
 # Firmware Version in Lightbulb
 BULB_VERSION = 10
 
-# Sample time, default 0.2 (i.e. length of the record that will be analyzed)
-RECORD_SECONDS = 0.2
+# Minimal time in seconds between two colors sent to the Lightbulb, default 0.1
+BULB_MIN_INTERVAL = 0.1
+
+# Colors that differ by at most this much [0..255] per channel from the color sent last are not sent again, default 2
+BULB_MIN_DELTA = 2
+
+# Time in seconds between two checks of the Bluetooth connection to the Lightbulb, default 5
+BULB_CHECK_SECONDS = 5
+
+# Sample time, default 0.4 (i.e. length of the record that will be analyzed)
+WINDOW_SECONDS = 0.4
+
+# Time between the starts of two consecutive (overlapping) windows, the shortest one when adapting, default 0.2
+HOP_SECONDS = 0.2
+
+# Adapt window length and hop to the room and the device while running (see adaptive.py), default True
+ADAPTIVE_WINDOW = True
+
+# Bounds of the window length in seconds, for the adaptation and the button, default 0.2 and 2.0
+MIN_WINDOW_SECONDS = 0.2
+MAX_WINDOW_SECONDS = 2.0
+
+# Maximal time in seconds from the start of the analyzed sound to its result (window length + analysis), default 1.0
+LATENCY_BUDGET = 1.0
+
+# Minimal fraction [0..1] of analyzed windows with a valid result, longer windows are used below it, default 0.6
+MIN_VALID = 0.6
+
+# Time in seconds a window length chosen with the button is kept, before the adaptation continues, default 60
+WINDOW_OVERRIDE_SECONDS = 60
+
+# Length of the ring buffer holding the recorded sound (upper bound for the sample time), default 5
+RING_SECONDS = 5
+
+# Number of microphone channels recorded, e.g. 2, 4 or 6 on a far-field microphone array, default 1
+CHANNELS = 1
+
+# Number of best channels (by signal to noise ratio) analyzed in parallel and fused, 1 analyzes the best only, default 1
+CHANNEL_TOP = 1
+
+# Number of items that may wait between two pipeline stages, default 2
+QUEUE_SIZE = 2
+
+# What a full queue between two pipeline stages does: 'drop-oldest' or 'latest-wins', default 'drop-oldest'
+DROP_POLICY = 'drop-oldest'
+
+# Sample rate Vokaturi analyzes at, e.g. 16000 or 22050; None analyzes at the recording rate (44100), default 22050
+ANALYSIS_RATE = 22050
 
 # Number of samples to calc. the moving avergage, default 8
 MOVE_AVG = 8
 
+# How to smooth the emotions: 'mavg' (moving average over MOVE_AVG samples) or 'ema' (exponential), default 'mavg'
+SMOOTHING = 'mavg'
+
+# Time constant in seconds of the exponential moving average, default 1.0
+EMA_SECONDS = 1.0
+
+# Minimal change [0..1] of an emotion before the shown color follows, 0 follows every change, default 0
+HYSTERESIS = 0
+
 # Minimal loudness in sound input required for analysis [0..100], default 63
 MIN_LOUDNESS = 63
 
+# Skip the analysis of sound that is too quiet (see MIN_LOUDNESS) or too noisy to be speech, default True
+VAD = True
+
+# Maximal zero-crossing rate [0..1] of sound still considered speech (hiss and noise cross zero more often), default 0.4
+VAD_MAX_ZCR = 0.4
+
+# Number of windows still analyzed after speech was last detected, default 2
+VAD_HANGOVER = 2
+
 # Show color of strongest emotion vs. mixing color by emotion strength, default False
 DISCRETE = False
 
@@ -26,10 +90,53 @@ sadness = [0,0,255] # blue
 anger = [255,0,0] # red
 fear = [255,0,255] # pink
 
+# Number of light updates per second, independent of the analysis rate, default 30
+FRAME_RATE = 30
+
+# Time in seconds to move from one color to the next, default 0.5
+TRANSITION_SECONDS = 0.5
+
+# Time in seconds to fade to dark, when no emotion was recognized, default 2
+FADE_SECONDS = 2
+
+# Easing of the color transitions: 'linear', 'ease-in-out' or 'ease-out', default 'ease-in-out'
+EASING = 'ease-in-out'
+
 # Use on device NEO-Pixels [0..3] where 0 means to not used them and 3 means use all off them, default 3
 NEO_PIXELS = 3
 
 # Maximal brightness for NEO-Pixels [0..255], default 16
 MAX_NEO_VALUE = 16
 
+# Status display: 'terminal', 'json' (JSON lines on stdout), 'none' or 'auto' (terminal if any), default 'auto'
+DISPLAY = 'auto'
+
+# Maximal number of display updates per second, default 5
+DISPLAY_RATE = 5
+
+# Zones run by zones.py, each an independent lamp on its own process, e.g.
+# [{'name': 'kitchen', 'mac': 'f8:1d:78:63:45:9d', 'input_device': 2, 'leds': 3, 'button': True},
+#  {'name': 'office', 'mac': 'f8:1d:78:63:12:34', 'input_device': 3}]
+# 'input_device' is the PyAudio device index, see EmoLamp for all settings; emoLamp.py ignores ZONES, default []
+ZONES = []
+
+# Time in seconds after which zones.py restarts a zone that stopped responding, default 30
+ZONE_TIMEOUT = 30
+
+# Serve metrics (stage latencies, dropped frames, ...) as JSON on http://127.0.0.1:<port>/, None to not, default 8765
+METRICS_PORT = 8765
+
+# Write the metrics into eli.log every that many seconds, 0 to not log them, default 0
+METRICS_LOG_SECONDS = 0
+
+# Directory of the emotion log (results only, never sound), one subdirectory per lamp or zone, None to not log,
+# default 'emotions'; print it with: python3 emolog.py --dir emotions/lamp [--minutes | --hours]
+EMOTION_LOG = 'emotions'
+
+# Number of results kept in the emotion log (40 bytes each), the oldest are overwritten, default 1000000 (40 MB)
+EMOTION_LOG_RECORDS = 1000000
+
+# Write the recorded and normalized sound into wave files (sound.wav, normalized.wav), default False
+DEBUG_DUMP = False
+
 #EOF
\ No newline at end of file
@@ -0,0 +1,132 @@
+# pipeline.py
+# Long-lived worker threads, connected by bounded queues that never block the producer
+
+import collections
+import logging
+import threading
+import time
+
+DROP_OLDEST = 'drop-oldest'  # a full queue discards its oldest item to make room for the new one
+LATEST_WINS = 'latest-wins'  # a consumer only ever gets the newest item, older ones are discarded
+
+
+class Bypass:
+    """
+    Returned by a stage to have its result processed by the named later stage next, skipping the ones in between.
+    The stages in between pass it on untouched, through the same queues, so that it cannot overtake the items
+    ahead of it.
+    """
+
+    def __init__(self, stage, item):
+        self.stage = stage
+        self.item = item
+
+
+class DropQueue:
+    """
+    Bounded queue whose put() never blocks: when the consumer is slower than the producer,
+    items are dropped according to the policy, and counted in `dropped`.
+    """
+
+    def __init__(self, maxsize=2, policy=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, LATEST_WINS):
+            raise ValueError('unknown drop policy %r' % policy)
+        self.policy = policy
+        self.dropped = 0
+        self._items = collections.deque(maxlen=1 if policy == LATEST_WINS else maxsize)
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1  # the deque discards the oldest item
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Returns the next item, or None if there was none within timeout seconds"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                return None
+            return self._items.popleft()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class Stage(threading.Thread):
+    """
+    Worker thread that calls func for every item in its inbox and puts the (not None) result into its outbox.
+    A stage without inbox is a source and calls func() repeatedly; func is expected to block for a while,
+    but not forever, so that the stage notices when the pipeline is stopped.
+    """
+
+    def __init__(self, name, func, inbox, outbox, stopped, metrics=None):
+        threading.Thread.__init__(self, name=name, daemon=True)
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stopped = stopped
+        self.metrics = metrics  # gets the time func took per item, not the time spent waiting for one
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                if self.inbox is None:
+                    result = self.func()
+                else:
+                    item = self.inbox.get(timeout=0.1)
+                    if item is None:
+                        continue
+                    if isinstance(item, Bypass):
+                        if item.stage != self.name:  # not for this stage, keep its place in the line
+                            if self.outbox is not None:
+                                self.outbox.put(item)
+                            continue
+                        item = item.item
+                    t0 = time.perf_counter()
+                    result = self.func(item)
+                    if self.metrics is not None:
+                        self.metrics.observe(self.name, time.perf_counter() - t0)
+                if result is not None and self.outbox is not None:
+                    self.outbox.put(result)
+            except Exception:  # the stage lives as long as the lamp, one bad item must not end it
+                logging.exception('%s stage failed' % self.name)
+
+
+class Pipeline:
+    """Chain of stages, the first one being the source, each connected to the next by a DropQueue"""
+
+    def __init__(self, queue_size=2, policy=DROP_OLDEST, metrics=None):
+        self.queue_size = queue_size
+        self.policy = policy
+        self.metrics = metrics
+        self.stages = []
+        self.stopped = threading.Event()
+
+    def add(self, name, func):
+        """Appends a stage, which receives the results of the previously added stage"""
+        inbox = None
+        if self.stages:
+            inbox = DropQueue(self.queue_size, self.policy)
+            self.stages[-1].outbox = inbox
+        self.stages.append(Stage(name, func, inbox, None, self.stopped, self.metrics))
+        return self
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def alive(self):
+        """Returns True while all stages are running"""
+        return all(stage.is_alive() for stage in self.stages)
+
+    def dropped(self):
+        """Returns the number of items dropped in front of each stage"""
+        return {stage.name: stage.inbox.dropped for stage in self.stages if stage.inbox is not None}
+
+    def shutdown(self, timeout=2.0):
+        """Stops all stages and waits up to timeout seconds for each of them to finish its current item"""
+        self.stopped.set()
+        for stage in self.stages:
+            stage.join(timeout)
@@ -0,0 +1,44 @@
+# resampler.py
+# Polyphase resampling from the capture rate down to the (lower) rate Vokaturi analyzes at
+
+import fractions
+import numpy
+
+
+class Resampler:
+    """
+    Resamples windows of audio by the rational factor target_rate / rate, using a polyphase FIR filter,
+    which also low-pass filters the signal below the new Nyquist frequency.
+    Emotion features live well below 8 kHz, so 16000 or 22050 keeps what Vokaturi needs.
+    """
+
+    def __init__(self, rate, target_rate):
+        self.rate = rate
+        self.target_rate = target_rate
+        factor = fractions.Fraction(int(target_rate), int(rate))
+        self.up = factor.numerator
+        self.down = factor.denominator
+        self._resample_poly = None
+        self._taps = None
+        if self.up == 1 and 1 < self.down:  # plain decimation, e.g. 44100 -> 22050, needs no scipy
+            self._taps = lowpass(self.down)
+        elif self.up != self.down:
+            from scipy.signal import resample_poly  # slow to import on a Pi Zero, only needed when resampling
+            self._resample_poly = resample_poly
+
+    def __call__(self, samples):
+        """Returns the resampled float64 samples (along the first axis), or the samples as is at the same rate"""
+        if self.up == self.down:
+            return samples
+        if self._taps is not None:
+            if samples.ndim == 1:
+                return numpy.convolve(samples, self._taps, 'same')[::self.down]
+            return numpy.stack([self(channel) for channel in samples.T], axis=1)
+        return self._resample_poly(samples, self.up, self.down, axis=0)
+
+
+def lowpass(down, half_length=10):
+    """Returns the FIR low-pass filter taps scipy.signal.resample_poly uses for decimation by down"""
+    n = numpy.arange(-half_length * down, half_length * down + 1)
+    taps = numpy.sinc(n / down) * numpy.kaiser(len(n), 5.0)
+    return taps / taps.sum()
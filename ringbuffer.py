@@ -0,0 +1,70 @@
+# ringbuffer.py
+# Fixed-size audio ring buffer, written by the capture and read as (overlapping) windows by the analysis
+
+import threading
+import numpy
+
+
+class RingBuffer:
+    """
+    Holds the most recent `size` frames of audio in a preallocated NumPy array.
+
+    Frames are addressed by their absolute position, i.e. the number of frames written before them.
+    `written` is the position just behind the newest frame; frames older than `written - size`
+    have been overwritten. A window is read by the position of its end, which lets the analysis
+    step through the audio by any hop size, independent of the chunk size used by the capture.
+
+    `dropped` counts the frames that were never part of any window read, because the reader skipped
+    ahead or the frames had been overwritten before the reader got to them. Counting starts with the
+    first window read, the frames before it were recorded while the analysis was still starting.
+    """
+
+    def __init__(self, size, channels=1, dtype=numpy.int16):
+        self.size = size
+        self.channels = channels
+        self.written = 0
+        self.dropped = 0
+        self._covered = None  # position just behind the newest frame read so far
+        self._data = numpy.zeros((size, channels) if 1 < channels else size, dtype=dtype)
+        self._cond = threading.Condition()
+
+    def write(self, frames):
+        """Appends raw interleaved frames (bytes) or an array of frames, overwriting the oldest ones"""
+        if isinstance(frames, (bytes, bytearray, memoryview)):
+            frames = numpy.frombuffer(frames, dtype=self._data.dtype)
+            if 1 < self.channels:
+                frames = frames.reshape(-1, self.channels)
+        n = len(frames)
+        with self._cond:
+            if self.size < n:
+                frames = frames[n - self.size:]
+            start = (self.written + n - len(frames)) % self.size
+            first = min(len(frames), self.size - start)
+            self._data[start:start + first] = frames[:first]
+            self._data[:len(frames) - first] = frames[first:]
+            self.written += n
+            self._cond.notify_all()
+        return n
+
+    def wait(self, position, timeout=None):
+        """Blocks until the frame at position-1 has been written, returns the current write position"""
+        with self._cond:
+            self._cond.wait_for(lambda: position <= self.written, timeout)
+            return self.written
+
+    def read(self, length, end=None):
+        """Returns a copy of the `length` frames ending at position `end` (default: the newest frame)"""
+        with self._cond:
+            end = self.written if end is None else end
+            if self.written < end or end - length < max(0, self.written - self.size):
+                raise ValueError('window [%d, %d) is not in the ring buffer' % (end - length, end))
+            if self._covered is None:
+                self._covered = end - length
+            if self._covered < end - length:
+                self.dropped += end - length - self._covered
+            self._covered = max(self._covered, end)
+            start = (end - length) % self.size
+            first = min(length, self.size - start)
+            if first == length:
+                return self._data[start:start + length].copy()
+            return numpy.concatenate((self._data[start:], self._data[:length - first]))
@@ -0,0 +1,70 @@
+# smoother.py
+# Smooths the stream of EmotionProbabilities, to keep the lamp from flickering
+
+import math
+import numpy
+import Vokaturi
+
+EMOTIONS = ('neutrality', 'happiness', 'sadness', 'anger', 'fear')
+MAVG = 'mavg'  # moving average over the non-zero observations among the last `size`
+EMA = 'ema'  # exponential moving average over the non-zero observations, with time constant `tau`
+
+
+class Smoother:
+    """
+    Keeps the last `size` observations in a (size x 5) NumPy ring buffer, with running sums for O(1) updates.
+
+    update() returns (count, EmotionProbabilities), count being the number of non-zero observations among
+    the last `size`. If count is 0, the lamp has heard nothing worth showing and all probabilities are 0.
+    With hysteresis > 0 the returned probabilities only change once one of them moved by more than
+    hysteresis, which stops the colour from flickering between two close readings.
+    """
+
+    def __init__(self, size, mode=MAVG, tau=1.0, interval=0.2, hysteresis=0.0):
+        if mode not in (MAVG, EMA):
+            raise ValueError('unknown smoothing mode %r' % mode)
+        self.size = size
+        self.mode = mode
+        self.tau = tau
+        self.set_interval(interval)
+        self.hysteresis = hysteresis
+        self._ring = numpy.zeros((size, len(EMOTIONS)))
+        self._nonzero = numpy.zeros(size, dtype=bool)
+        self._sum = numpy.zeros(len(EMOTIONS))
+        self._count = 0
+        self._index = 0
+        self._updates = 0
+        self._ema = None
+        self._shown = numpy.zeros(len(EMOTIONS))
+
+    def set_interval(self, interval):
+        """Sets the time in seconds between two observations, e.g. when the hop between windows changes"""
+        self.interval = interval
+        self.alpha = 1 - math.exp(-interval / self.tau)  # EMA weight of a new observation
+
+    def update(self, ep):
+        """Adds the provided EmotionProbabilities, returns the smoothed (count, EmotionProbabilities)"""
+        x = numpy.array([ep.neutrality, ep.happiness, ep.sadness, ep.anger, ep.fear])
+        nonzero = bool(x.any())
+        i = self._index
+        self._sum += x - self._ring[i]
+        self._count += int(nonzero) - int(self._nonzero[i])
+        self._ring[i] = x
+        self._nonzero[i] = nonzero
+        self._index = i + 1 if i + 1 < self.size else 0
+        self._updates += 1
+        if self._updates % self.size == 0:
+            self._sum = self._ring.sum(axis=0)  # no drift in the running sums from rounding
+
+        if self._count == 0:
+            self._ema = None
+            b = numpy.zeros(len(EMOTIONS))
+        elif self.mode == EMA:
+            if nonzero:
+                self._ema = x if self._ema is None else self._ema + self.alpha * (x - self._ema)
+            b = self._ema
+        else:
+            b = self._sum / self._count
+        if self.hysteresis <= 0 or self._count == 0 or self.hysteresis < numpy.abs(b - self._shown).max():
+            self._shown = b
+        return self._count, Vokaturi.EmotionProbabilities(*self._shown)
@@ -0,0 +1,94 @@
+# transition.py
+# Light output engine: runs at its own frame rate and eases from the current color to the newest target color
+
+import logging
+import threading
+import time
+
+EASINGS = {
+    'linear': lambda t: t,
+    'ease-in-out': lambda t: t * t * (3 - 2 * t),  # smoothstep
+    'ease-out': lambda t: 1 - (1 - t) ** 3,
+}
+
+
+class Transition(threading.Thread):
+    """
+    Decouples the light updates from the analysis rate.
+
+    set_target() may be called at any rate; the engine moves from the color currently shown to the target
+    within `duration` seconds, or within `fade` seconds if the target is black (nothing heard, the lamp dims),
+    and sends every frame that differs from the previous one to all sinks, at most `frame_rate` times a second.
+    While no transition is running the thread sleeps until the next target arrives.
+
+    The analysis sets a target every hop, usually while the last transition is still running. A target within
+    one step of the current one is ignored, and a transition that replaces a running one eases out only: it
+    starts at speed instead of from standing still, so that the light keeps moving rather than stuttering.
+    """
+
+    def __init__(self, sinks, frame_rate=30, duration=0.5, fade=2.0, easing='ease-in-out'):
+        threading.Thread.__init__(self, name='transition', daemon=True)
+        if easing not in EASINGS:
+            raise ValueError('unknown easing %r' % easing)
+        self.sinks = sinks
+        self.frame_time = 1.0 / frame_rate
+        self.duration = duration
+        self.fade = fade
+        self.ease = EASINGS[easing]
+        self._ease = self.ease  # of the running transition
+        self.frames = 0
+        self._start = [0.0, 0.0, 0.0]
+        self._target = [0.0, 0.0, 0.0]
+        self._start_time = 0.0
+        self._length = 0.0
+        self._shown = None
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def set_target(self, rgb):
+        """Starts a transition from the color shown right now to the provided one, unless that is the target already"""
+        with self._cond:
+            if max(abs(c - t) for c, t in zip(rgb, self._target)) <= 1:
+                return
+            now = time.monotonic()
+            running = now < self._start_time + self._length
+            self._start = self._current(now)
+            self._target = [float(c) for c in rgb]
+            self._start_time = now
+            self._ease = EASINGS['ease-out'] if running else self.ease
+            self._length = self.fade if not any(rgb) else self.duration
+            self._cond.notify()
+
+    def _current(self, now):
+        if self._length <= 0 or self._start_time + self._length <= now:
+            return list(self._target)
+        e = self._ease((now - self._start_time) / self._length)
+        return [a + e * (b - a) for a, b in zip(self._start, self._target)]
+
+    def run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                rgb = [int(round(c)) for c in self._current(now)]
+                done = self._start_time + self._length <= now
+            if rgb != self._shown:
+                self._shown = rgb
+                self.frames += 1
+                for sink in self.sinks:
+                    try:
+                        sink(list(rgb))
+                    except Exception:  # a failing sink must not stop the others, or the engine
+                        logging.exception('transition sink failed')
+            with self._cond:
+                if done and not self._stopped:
+                    self._cond.wait_for(lambda: self._stopped or now < self._start_time)
+                else:
+                    self._cond.wait(max(0.0, now + self.frame_time - time.monotonic()))
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self.join(timeout)
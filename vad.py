@@ -0,0 +1,51 @@
+# vad.py
+# Cheap voice activity detection on the raw recorded samples, to skip analysis in quiet rooms
+
+import math
+import numpy
+
+
+class VoiceActivityDetector:
+    """
+    Decides per window if it may contain speech, from short-time frame energy and zero-crossing rate.
+
+    A frame counts as voiced if it is louder than min_dbfs and its zero-crossing rate (sign changes per sample)
+    is at most max_zcr; hiss and fan noise cross zero far more often than voiced speech does.
+    A window is speech if it has at least one voiced frame. Once speech is detected, the following `hangover`
+    windows are reported as speech as well, so that the quiet ends of words are not cut off.
+    """
+
+    def __init__(self, rate, min_dbfs=-40.0, max_zcr=0.4, hangover=2, frame_seconds=0.02):
+        self.frame_length = max(1, int(rate * frame_seconds))
+        self.configure(min_dbfs, max_zcr, hangover)
+        self.dbfs = -math.inf  # loudness of the last window
+        self._remaining = 0
+
+    def configure(self, min_dbfs, max_zcr, hangover):
+        """Sets the thresholds, also while running"""
+        self.min_power = (10 ** (min_dbfs / 10)) * 32768.0 ** 2  # mean square of int16 samples
+        self.max_zcr = max_zcr
+        self.hangover = hangover
+
+    def __call__(self, samples):
+        """Returns True if the provided int16 samples may contain speech"""
+        if samples.ndim != 1:
+            samples = samples.mean(axis=1)
+        n = len(samples) // self.frame_length * self.frame_length
+        if n == 0:
+            return False
+        frames = samples[:n].reshape(-1, self.frame_length).astype(numpy.float32)
+        power = numpy.einsum('ij,ij->i', frames, frames) / self.frame_length
+        mean_power = float(power.mean())
+        self.dbfs = 10 * math.log10(mean_power / 32768.0 ** 2) if 0 < mean_power else -math.inf
+        loud = self.min_power < power
+        if loud.any():
+            signs = numpy.signbit(frames[loud])
+            zcr = numpy.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_length
+            if (zcr <= self.max_zcr).any():
+                self._remaining = self.hangover
+                return True
+        if 0 < self._remaining:
+            self._remaining -= 1
+            return True
+        return False
@@ -0,0 +1,160 @@
+# zones.py
+# Runs several lamps (zones), each with its own microphone, bulb and pipeline, from one supervisor process
+# Usage: python3 zones.py  (the zones are listed in params.ZONES)
+
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import numpy
+import metrics
+import params
+import smoother
+
+# heartbeat is time.monotonic() (system wide on Linux, never stepped by NTP), updated the wall clock time
+FIELDS = ('heartbeat', 'updated', 'dbfs', 'count') + smoother.EMOTIONS + ('red', 'green', 'blue')
+HEARTBEAT_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60
+ZONE_DEFAULTS = {'leds': 0, 'button': False, 'metrics_port': None, 'display': 'none'}
+
+
+class ZoneTable:
+    """
+    The latest result of every zone, one row of FIELDS per zone, in shared memory: zone processes write
+    their own row, the supervisor reads all of them. Rows are written and read under the array's lock.
+    """
+
+    def __init__(self, count, ctx=multiprocessing):
+        self.array = ctx.Array('d', count * len(FIELDS))
+        self.count = count
+
+    def rows(self):
+        return numpy.frombuffer(self.array.get_obj()).reshape(self.count, len(FIELDS))
+
+    def write(self, index, **values):
+        with self.array.get_lock():
+            row = self.rows()[index]
+            for name, value in values.items():
+                row[FIELDS.index(name)] = value
+
+    def read(self):
+        with self.array.get_lock():
+            return self.rows().copy()
+
+
+def run_zone(index, zone, table):
+    """Entry point of a zone process: runs one EmoLamp, publishing its results into the table"""
+    import emoLamp  # imported in the zone process only, the supervisor never touches any hardware
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    parent = os.getppid()
+    app = emoLamp.EmoLamp(zone)
+
+    def publish(decibel, k, ep, col):
+        # the heartbeat: the output stage runs for every window, silent ones included
+        table.write(index, heartbeat=time.monotonic(), updated=time.time(), dbfs=decibel, count=k,
+                    red=col[0], green=col[1], blue=col[2], **{emo: getattr(ep, emo) for emo in smoother.EMOTIONS})
+
+    app.publish = publish
+    try:
+        app.start()
+        while os.getppid() == parent:  # ends with the supervisor
+            if not app.lamp.alive():
+                logging.error('zone %s: a pipeline stage died' % app.name)
+                sys.exit(1)
+            time.sleep(HEARTBEAT_SECONDS)
+    finally:
+        app.shutdown()
+
+
+class Supervisor:
+    """
+    Starts one process per zone, so that the zones run on separate cores, and restarts zones that exited
+    or stopped sending heartbeats (results) for `timeout` seconds, i.e. zones whose pipeline hangs. Restarts
+    back off exponentially (1, 2, 4 .. 60 s) while a zone keeps crashing, and start over once it ran for
+    MAX_BACKOFF_SECONDS.
+    """
+
+    def __init__(self, zones, timeout=30.0):
+        self.zones = []
+        for i, zone in enumerate(zones):
+            self.zones.append(dict(ZONE_DEFAULTS, name='zone%d' % i))
+            self.zones[-1].update(zone)
+        self.timeout = timeout
+        self.ctx = multiprocessing.get_context('spawn')  # no forking of the supervisor's threads
+        self.table = ZoneTable(len(self.zones), self.ctx)
+        self.processes = [None] * len(self.zones)
+        self.started = [0.0] * len(self.zones)
+        self.crashes = [0] * len(self.zones)
+        self.next_start = [0.0] * len(self.zones)
+        self.restarts = [0] * len(self.zones)
+
+    def start_zone(self, i):
+        self.table.write(i, heartbeat=time.monotonic())
+        process = self.ctx.Process(target=run_zone, args=(i, self.zones[i], self.table),
+                                   name=self.zones[i]['name'], daemon=True)
+        process.start()
+        self.processes[i] = process
+        self.started[i] = time.monotonic()
+        logging.info('zone %s started, pid %d' % (self.zones[i]['name'], process.pid))
+
+    def check(self):
+        """Restarts the zones that exited or hang, once their backoff passed"""
+        now = time.monotonic()
+        heartbeats = self.table.read()[:, FIELDS.index('heartbeat')]
+        for i, process in enumerate(self.processes):
+            if process is not None:
+                if process.is_alive() and now - heartbeats[i] <= self.timeout:
+                    if MAX_BACKOFF_SECONDS < now - self.started[i]:
+                        self.crashes[i] = 0
+                    continue
+                if process.is_alive():
+                    logging.warning('zone %s hangs, terminating it' % self.zones[i]['name'])
+                    process.terminate()
+                    process.join(self.timeout)
+                    if process.is_alive():
+                        process.kill()
+                logging.warning('zone %s exited with %s' % (self.zones[i]['name'], process.exitcode))
+                self.processes[i] = None
+                self.next_start[i] = now + min(MAX_BACKOFF_SECONDS, 2 ** self.crashes[i])
+                self.crashes[i] += 1
+                self.restarts[i] += 1
+            elif self.next_start[i] <= now:
+                self.start_zone(i)
+
+    def snapshot(self):
+        """Returns the latest result of every zone"""
+        rows = self.table.read()
+        return {zone['name']: dict(zip(FIELDS, [round(v, 4) for v in row.tolist()]),
+                                   alive=p is not None and p.is_alive(), restarts=n)
+                for zone, row, p, n in zip(self.zones, rows, self.processes, self.restarts)}
+
+    def run(self, interval=1.0):
+        """Supervises the zones until interrupted"""
+        while True:
+            self.check()
+            time.sleep(interval)
+
+    def stop(self, timeout=5.0):
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(filename='eli.log', level=logging.INFO, format='%(asctime)s %(processName)s %(message)s')
+    supervisor = Supervisor(params.ZONES, params.ZONE_TIMEOUT)
+    stats = metrics.Metrics()
+    stats.add_source('zones', supervisor.snapshot)
+    if params.METRICS_PORT:
+        stats.serve(params.METRICS_PORT)
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()